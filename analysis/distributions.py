@@ -5,9 +5,37 @@ For a good introduction to the theory of percolation, see:
 Introduction to Percolation Theory, D. Stauffer & A. Aharony, Taylor & Francis (2003). 
 """
 
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import hypergraphs
 from scipy import sparse as spr
+from scipy import linalg as la
+from scipy.sparse.csgraph import connected_components
+from threadpoolctl import threadpool_limits
+
+
+def size_counts(cs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Count how many clusters there are of each size.
+
+    Equivalent to np.unique(cs, return_counts=True), but as cluster sizes are small
+    positive integers (at most 2**N), a histogram with np.bincount avoids sorting cs.
+    
+    Parameters:
+
+    cs : a numpy array of cluster sizes.
+
+    Returns:
+
+    s : an array of the cluster sizes present, in ascending order
+    counts : an array of the number of clusters of each size. counts[i] is the number of
+             clusters of size s[i].
+    """
+    all_counts = np.bincount(np.asarray(cs, dtype=np.intp))
+    s = np.flatnonzero(all_counts)
+
+    return s, all_counts[s]
 
 
 def cluster_numbers(cs: np.ndarray) -> tuple[np.ndarray, np.ndarray]: 
@@ -31,7 +59,7 @@ def cluster_numbers(cs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
     N_CLUSTERS = len(cs)
 
     # how many (counts) of each cluster size s are there?
-    s, counts = np.unique(cs, return_counts=True) 
+    s, counts = size_counts(cs)
     n_s = counts/(s*N_CLUSTERS)
 
     return s, n_s
@@ -93,18 +121,19 @@ def w_s(cs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
           is part of an s-cluster. s[i] is the size of a cluster with w_s value w_s[i].
     """
     N_CLUSTERS = len(cs)
-    s, counts = np.unique(cs, return_counts=True)
+    s, counts = size_counts(cs)
     w_s = counts/N_CLUSTERS
 
     return s, w_s
 
 
 def get_clusters_hypercube(N : int, NR : int, p : float, data_path : str) -> np.ndarray:
-    """ Attempt to load hypercube cluster data, else generate and save it."""
+    """ Attempt to load hypercube cluster data, else generate and save it. Saved data
+    is memory-mapped (read-only) rather than read into memory."""
     name = f"clusters_hypercube_N{N}_NR{NR}_p{p:.4f}.npy"
 
     try:
-        clusters = np.load(data_path + name)
+        clusters = np.load(data_path + name, mmap_mode="r")
 
     except FileNotFoundError:
         print(f"Generating data: {name}")
@@ -115,11 +144,12 @@ def get_clusters_hypercube(N : int, NR : int, p : float, data_path : str) -> np.
 
 
 def get_clusters_PXP(N : int, NR : int, p : float, data_path : str) -> np.ndarray:
-    """ Attempt to load PXP cluster data, else generate and save it."""
+    """ Attempt to load PXP cluster data, else generate and save it. Saved data
+    is memory-mapped (read-only) rather than read into memory."""
     name = f"clusters_PXP_N{N}_NR{NR}_p{p:.4f}.npy"
 
     try:
-        clusters = np.load(data_path + name)
+        clusters = np.load(data_path + name, mmap_mode="r")
 
     except FileNotFoundError:
         print(f"Generating data: {name}")
@@ -128,25 +158,55 @@ def get_clusters_PXP(N : int, NR : int, p : float, data_path : str) -> np.ndarra
     
     return clusters
 
+def save_H_data(path : str, H_data):
+    """Save a list of (H, s) as one block-diagonal sparse matrix of all the H
+    (path + "_H.npz"), and the cluster sizes and block offsets (path + ".npz")."""
+    sizes = np.fromiter((size for (_, size) in H_data), dtype=np.int64)
+    offsets = np.cumsum([0] + [H.shape[0] for (H, _) in H_data])
+
+    spr.save_npz(path + "_H.npz", spr.block_diag([H for (H, _) in H_data], format="csr"))
+    np.savez(path + ".npz", sizes=sizes, offsets=offsets)
+
+
+def load_H_data(path : str):
+    """Load a list of (H, s) saved by save_H_data, slicing each H back out of the
+    block-diagonal matrix."""
+    with np.load(path + ".npz") as data:
+        sizes = data["sizes"]
+        offsets = data["offsets"]
+    H_all = spr.load_npz(path + "_H.npz").tocsr()
+
+    return [(H_all[start:stop, start:stop], int(size)) for start, stop, size in zip(offsets[:-1], offsets[1:], sizes)]
+
+
+def save_path_lengths(path : str, data):
+    """Save a list of arrays of path lengths (path + ".npz", compressed) as one
+    concatenated array, plus the offset of each array within it."""
+    offsets = np.cumsum([0] + [len(lengths) for lengths in data])
+    np.savez_compressed(path + ".npz", lengths=np.concatenate(data), offsets=offsets)
+
+
+def load_path_lengths(path : str):
+    """Load a list of arrays of path lengths saved by save_path_lengths."""
+    with np.load(path + ".npz") as data:
+        return np.split(data["lengths"], data["offsets"][1:-1])
+
+
 def get_H_SC_hypercube(N : int, NR : int, p : float, data_path : str):
     """Attempt to load H single cluster data, else generate and save it. H is stored
     as a sparse matrix. Returns: (H,s), where s is the size of the cluster."""
 
-    name = f"H_SC_hypercube_N{N}_NR{NR}_p{p:.4f}.npy"
+    name = f"H_SC_hypercube_N{N}_NR{NR}_p{p:.4f}"
 
     try:
-        H_data = np.load(data_path + name, allow_pickle=True)
+        H_data = load_H_data(data_path + name)
     
     except FileNotFoundError:
         print(f"Generating data: {name}")
-        H_data = []
-        for _ in range(NR):
-            data = hypergraphs.hypercube_H_SC(N, p)
-            H = spr.csr_matrix(data[0])
-            size = data[1]
-            H_data.append((H, size))
+        # one call generates all NR realisations, each H as (data, indices, indptr)
+        H_data = [(spr.csr_matrix(csr, shape=(2**N, 2**N)), size) for (csr, size) in hypergraphs.hypercube_H_SC_batch(N, NR, p)]
 
-        np.save(data_path + name, H_data)
+        save_H_data(data_path + name, H_data)
 
     return H_data
 
@@ -157,19 +217,16 @@ def get_path_lengths_hypercube(N : int, NR : int, p : float, data_path : str):
     list of length NR, where each element is an array of path lengths, of length
     equal to the size of the cluster."""
 
-    name = f"paths_hypercube_N{N}_NR{NR}_p{p:.4f}.npy"
+    name = f"paths_hypercube_N{N}_NR{NR}_p{p:.4f}"
 
     try:
-        data = np.load(data_path + name, allow_pickle=True)
+        data = load_path_lengths(data_path + name)
 
     except FileNotFoundError:
         print(f"Generating data: {name}")
-        data = []
-        for _ in range(NR):
-            pathlengths = hypergraphs.hypercube_dijkstra(N, p)
-            data.append(pathlengths)
+        data = hypergraphs.hypercube_dijkstra_batch(N, NR, p)
 
-        np.save(data_path + name, data)
+        save_path_lengths(data_path + name, data)
 
     return data
 
@@ -177,43 +234,139 @@ def get_H_LC_hypercube(N : int, NR : int, p : float, data_path : str):
     """Attempt to load H LARGEST cluster data, else generate and save it. H is stored
     as a sparse matrix. Returns: (H,s), where s is the size of the cluster."""
 
-    name = f"H_LC_hypercube_N{N}_NR{NR}_p{p:.4f}.npy"
+    name = f"H_LC_hypercube_N{N}_NR{NR}_p{p:.4f}"
 
     try:
-        H_data = np.load(data_path + name, allow_pickle=True)
+        H_data = load_H_data(data_path + name)
     
     except FileNotFoundError:
         print(f"Generating data: {name}")
-        H_data = []
-        for _ in range(NR):
-            data = hypergraphs.hypercube_H_LC(N, p)
-            H = spr.csr_matrix(data[0])
-            size = data[1]
-            H_data.append((H, size))
+        # one call generates all NR realisations, each H as (data, indices, indptr)
+        H_data = [(spr.csr_matrix(csr, shape=(2**N, 2**N)), size) for (csr, size) in hypergraphs.hypercube_H_LC_batch(N, NR, p)]
 
-        np.save(data_path + name, H_data)
+        save_H_data(data_path + name, H_data)
 
     return H_data
 
 
+def cluster_eigh(H, site : int):
+    """Diagonalise a sparse H on the sites of the cluster containing site only. The rest
+    of H cannot be reached from the cluster, so it need not be diagonalised. Returns:
+    (eigs, sites, vecs), where sites are the sites of the cluster, in ascending order, and
+    eigs and vecs (of shape (s, s)) are as returned by scipy.linalg.eigh, in the basis of
+    those sites."""
+    _, labels = connected_components(H, directed=False)
+    sites = np.flatnonzero(labels == labels[site])
+
+    # .toarray() gives a fresh buffer, so LAPACK may overwrite it
+    H_cluster = H[sites][:, sites].toarray()
+    eigs, vecs = la.eigh(H_cluster, driver="evr", overwrite_a=True, check_finite=False)
+
+    return eigs, sites, vecs
+
+
+def LC_eigh(H):
+    """cluster_eigh for a LARGEST cluster H, where the cluster is grown from the first
+    site with a bond (or site 0, if there are none)."""
+    H = H.tocsr()
+    site = int(np.argmax(np.diff(H.indptr) > 0))
+
+    return cluster_eigh(H, site)
+
+
+def limit_BLAS_threads():
+    """Limit a worker process to one BLAS/LAPACK thread. The realisations are already
+    divided between one process per CPU, so threaded BLAS in each of them as well would
+    run about cpu_count**2 threads."""
+    threadpool_limits(1)
+
+
+def H_data_digest(H_data) -> str:
+    """A SHA-256 digest of the CSR arrays of a list of (H, s), to check that data computed
+    from H is up to date. The arrays are cast to fixed dtypes first, so that H generated
+    by hypergraphs and H loaded by load_H_data give the same digest."""
+    digest = hashlib.sha256()
+    for (H, _) in H_data:
+        H = spr.csr_matrix(H).sorted_indices()
+        for a, dtype in ((H.indptr, np.int64), (H.indices, np.int64), (H.data, np.float64)):
+            digest.update(np.ascontiguousarray(a, dtype=dtype).tobytes())
+
+    return digest.hexdigest()
+
+
+def save_eigendecomps(path : str, data, H_digest : str):
+    """Save a list of (eigs, sites, vecs), as returned by cluster_eigh, as the concatenated
+    eigs, sites and (flattened) vecs, plus the cluster sizes and the H_data_digest of the
+    H they were computed from (path + ".npz")."""
+    sizes = np.fromiter((len(eigs) for (eigs, _, _) in data), dtype=np.int64)
+
+    np.savez(path + ".npz", sizes=sizes, H_digest=H_digest,
+             eigs=np.concatenate([eigs for (eigs, _, _) in data]),
+             sites=np.concatenate([sites for (_, sites, _) in data]),
+             vecs=np.concatenate([vecs.ravel() for (_, _, vecs) in data]))
+
+
+def load_eigendecomps(path : str):
+    """Load a list of (eigs, sites, vecs) saved by save_eigendecomps, and the digest of
+    the H they were computed from. Returns: (list of (eigs, sites, vecs), H_digest)."""
+    with np.load(path + ".npz") as data:
+        H_digest = str(data["H_digest"])
+        sizes = data["sizes"]
+        eigs = np.split(data["eigs"], np.cumsum(sizes)[:-1])
+        sites = np.split(data["sites"], np.cumsum(sizes)[:-1])
+        vecs = np.split(data["vecs"], np.cumsum(sizes**2)[:-1])
+
+    return [(e, s, v.reshape(size, size)) for e, s, v, size in zip(eigs, sites, vecs, sizes)], H_digest
+
+
+def get_eigendecomp_LC_hypercube(N : int, NR : int, p : float, data_path : str, workers=None):
+    """Attempt to load the eigendecompositions of the H LARGEST cluster data, else
+    compute (from the saved H data) and save them. The saved data is keyed on a digest
+    of the H data, so it is recomputed if the H data has been regenerated. Only the
+    cluster itself is diagonalised, with cluster_eigh, and the realisations are divided
+    between `workers` processes (default: one per CPU). Returns: list of length NR of
+    (eigs, sites, vecs), as returned by cluster_eigh."""
+
+    name = f"eig_cluster_LC_hypercube_N{N}_NR{NR}_p{p:.4f}"
+
+    H_data = get_H_LC_hypercube(N, NR, p, data_path)
+    H_digest = H_data_digest(H_data)
+
+    try:
+        eig_data, saved_H_digest = load_eigendecomps(data_path + name)
+    except FileNotFoundError:
+        saved_H_digest = None
+
+    if saved_H_digest != H_digest:
+        print(f"Generating data: {name}")
+
+        if workers is None:
+            workers = os.cpu_count()
+        chunksize = max(1, NR // (4 * workers))
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=limit_BLAS_threads) as pool:
+            eig_data = list(pool.map(LC_eigh, (H for (H, _) in H_data), chunksize=chunksize))
+
+        save_eigendecomps(data_path + name, eig_data, H_digest)
+
+    return eig_data
+
+
 def get_path_lengths_hypercube_LC(N : int, NR : int, p : float, data_path : str):
     """Attempt to load the distribution of path lengths for the largest cluster in the hypercube. 
     Otherwise, generate and save the data. Returns:
     list of length NR, where each element is an array of path lengths, of length
     equal to the size of the cluster."""
 
-    name = f"paths_hypercube_LC_N{N}_NR{NR}_p{p:.4f}.npy"
+    name = f"paths_hypercube_LC_N{N}_NR{NR}_p{p:.4f}"
 
     try:
-        data = np.load(data_path + name, allow_pickle=True)
+        data = load_path_lengths(data_path + name)
 
     except FileNotFoundError:
         print(f"Generating data: {name}")
-        data = []
-        for _ in range(NR):
-            pathlengths = hypergraphs.hypercube_dijkstra_LC(N, p)
-            data.append(pathlengths)
+        data = hypergraphs.hypercube_dijkstra_LC_batch(N, NR, p)
 
-        np.save(data_path + name, data)
+        save_path_lengths(data_path + name, data)
 
     return data
@@ -3,11 +3,14 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 import numpy as np
 import unittest
+from unittest import mock
 import hypergraphs
 import time_evolution as te
 import os, shutil
 import distributions
 from scipy import linalg as la
+from scipy import sparse as spr
+from scipy.sparse.linalg import expm_multiply
 from scipy.special import comb
 
 # where to save the temp data for testing
@@ -15,42 +18,42 @@ DATA_PATH = "./data/testing/"
 
 class Testeigenstates(unittest.TestCase):
     def setUp(self):
-        if not os.path.exists(DATA_PATH):
-            os.makedirs(DATA_PATH)
+        os.makedirs(DATA_PATH, exist_ok=True)
+
+        # MHD saves and loads its data in te.DATA_PATH, so point that at the test data too
+        patcher = mock.patch.object(te, "DATA_PATH", DATA_PATH)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def tearDown(self):
-        # delete the contents of the data/testing directory
-        for filename in os.listdir(DATA_PATH):
-            file_path = os.path.join(DATA_PATH, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print('Failed to delete %s. Reason: %s' % (file_path, e))
+        # delete the data/testing directory and its contents
+        shutil.rmtree(DATA_PATH, ignore_errors=True)
 
     def test_U_U_T(self):
         # Test the unitary operators which take us between the site and eigenbasis
 
         N = 7
+        NH = 2**N
         p = 1
-        H = hypergraphs.hypercube_H(N, p)
+        H = spr.csr_matrix(*hypergraphs.hypercube_H(N, p, sparse=True))
+        rng = np.random.default_rng(0)
 
-        eigs, vecs = np.linalg.eigh(H)
+        eigs, vecs = np.linalg.eigh(H.toarray())
 
         U = te.U(vecs)
         Ut = te.U_T(vecs)
 
-        # U_T @ H @ U = diag(eigs)
-        diag_H = np.diag(Ut @ H @ U)
-        np.testing.assert_array_almost_equal(eigs, diag_H, 6)
+        # U_T @ H @ U = diag(eigs). Check this on a few random vectors, with matrix-vector
+        # products only, rather than forming U_T @ H @ U
+        for _ in range(3):
+            v = rng.standard_normal(NH) + 1j*rng.standard_normal(NH)
+            np.testing.assert_allclose(Ut @ (H @ (U @ v)), eigs * v, atol=1e-8)
 
 
         # Now let's test with a complex random matrix! Test we're getting
         # the complex conjugation right.
 
-        c_matrix = np.random.rand(100, 100) + 1j*np.random.rand(100, 100)
+        c_matrix = rng.random((100, 100)) + 1j*rng.random((100, 100))
         c_matrix_hermitian = c_matrix + np.conjugate(c_matrix.T)
 
         eigs, vecs = np.linalg.eigh(c_matrix_hermitian)
@@ -59,8 +62,9 @@ class Testeigenstates(unittest.TestCase):
         Ut = te.U_T(vecs)
 
         # U_T @ H @ U = diag(eigs)
-        diag_H = np.diag(Ut @ c_matrix_hermitian @ U)
-        np.testing.assert_array_almost_equal(eigs, diag_H, 6)
+        for _ in range(3):
+            v = rng.standard_normal(100) + 1j*rng.standard_normal(100)
+            np.testing.assert_allclose(Ut @ (c_matrix_hermitian @ (U @ v)), eigs * v, atol=1e-8)
 
     def test_psi_0(self):
         # Test the construction of the initial state
@@ -99,9 +103,16 @@ class Testeigenstates(unittest.TestCase):
         # Check against explicit TE. Convert psi_t back into site basis
         psi0_explicit = np.zeros(NH)
         psi0_explicit[site] = 1
-        psit_explicit = la.expm(-1j*H*t) @ psi0_explicit
+        psit_explicit = expm_multiply(-1j*t*spr.csr_matrix(H), psi0_explicit)
         np.testing.assert_array_almost_equal(np.abs(psit_explicit), np.abs(vecs @ psit), decimal=8)
 
+        # Evolving to an array of times at once should agree with one time at a time
+        tlist = np.linspace(0, 100, 11)
+        psits = te.psi_t(eigs, psi0, tlist)
+        self.assertEqual(psits.shape, (len(tlist), NH))
+        for ti, t in enumerate(tlist):
+            np.testing.assert_array_almost_equal(psits[ti], te.psi_t(eigs, psi0, t), decimal=12)
+
     def test_D(self):
 
         # For this test, let's perform a calculation in the eigenbasis
@@ -139,6 +150,16 @@ class Testeigenstates(unittest.TestCase):
 
         self.assertAlmostEqual(MHD, MHD_exact, places=10)
 
+    def test_Hamming_distances(self):
+        # Compare against counting the differing bits by hand, for several
+        # start sites sharing the same cached popcount table
+        N = 7
+        te.popcounts.cache_clear()
+        for site in (0, 1, 53, 2**N - 1):
+            hds = te.Hamming_distances(N, site)
+            np.testing.assert_array_equal(hds, [bin(i ^ site).count("1") for i in range(2**N)])
+        self.assertEqual(te.popcounts.cache_info().misses, 1)
+
     def test_time_evolution(self):
         # Carry out a time evolution in the eigenbasis, and compare to 
         # the same calculation performed in the site basis
@@ -183,6 +204,13 @@ class Testeigenstates(unittest.TestCase):
         index = te.find_start_site(mock_H, N)
         self.assertEqual(index, site)
 
+        # the same, without converting a sparse H to a dense matrix
+        index = te.find_start_site(spr.csr_matrix(mock_H), N)
+        self.assertEqual(index, site)
+
+        # zero matrix: every site is its own cluster
+        self.assertEqual(te.find_start_site(spr.csr_matrix((NH, NH)), N), 0)
+
     def test_HD(self):
         # Test the final calculation: the computation of the Hamming distance for
         # an input array of times t.
@@ -208,6 +236,65 @@ class Testeigenstates(unittest.TestCase):
 
         np.testing.assert_array_almost_equal(HD, HDs[-2], decimal=10)
 
+        # The same, reusing work arrays and writing to out
+        bufs = te.HD_buffers(len(tlist), NH)
+        out = np.empty(len(tlist))
+        te.HD(eigs, vecs, start_site, tlist, N, out=out, bufs=bufs)
+        np.testing.assert_array_almost_equal(out, HDs, decimal=10)
+
+        # and with a cluster smaller than NH, in the same buffers
+        eigs_cluster, vecs_cluster = te.cluster_eigh_full_basis(spr.csr_matrix(H), start_site)
+        HDs_cluster = te.HD(eigs_cluster, vecs_cluster, start_site, tlist, N, bufs=bufs)
+        np.testing.assert_array_almost_equal(HDs_cluster, HDs, decimal=6)
+
+    def test_eigenspace_projections(self):
+        # On the full hypercube, the levels are N - 2j, for j = 0, ..., N
+
+        N = 7
+        NH = 2**N
+        site = 93
+
+        H = hypergraphs.hypercube_H(N, 1)
+        eigs, vecs = np.linalg.eigh(H)
+        levels, phi = te.eigenspace_projections(eigs, vecs, site, N)
+
+        np.testing.assert_array_almost_equal(levels, np.arange(-N, N+1, 2), decimal=10)
+        self.assertEqual(phi.shape, (NH, N+1))
+
+        # The projections add up to the start state
+        start_state = np.zeros(NH)
+        start_state[site] = 1
+        np.testing.assert_array_almost_equal(np.sum(phi, axis=1), start_state, decimal=10)
+
+    def test_weighted_norms(self):
+        # Compare the fused reduction to the explicit |psi|^2 @ weights
+
+        N = 6
+        NT = 13
+        psit = np.random.rand(NT, 2**N) + 1j*np.random.rand(NT, 2**N)
+        hds = te.Hamming_distances(N, 0)
+
+        np.testing.assert_array_almost_equal(te.weighted_norms(psit, hds), (np.abs(psit)**2) @ hds, decimal=10)
+
+    def test_cluster_eigh_full_basis(self):
+        # Diagonalising only the cluster should give the same HD as diagonalising all of H
+
+        N = 7
+        p = 0.29
+        tlist = np.logspace(0, 6, 20)
+
+        H, size = hypergraphs.hypercube_H_LC(N, p)
+        start_site = te.find_start_site(H, N)
+        eigs, vecs = np.linalg.eigh(H)
+        HDs = te.HD(eigs, vecs, start_site, tlist, N)
+
+        # The eigenvectors only span the cluster, but are written in the full site basis
+        eigs_cluster, vecs_cluster = te.cluster_eigh_full_basis(spr.csr_matrix(H), start_site)
+        self.assertEqual(vecs_cluster.shape, (2**N, size))
+        HDs_cluster = te.HD(eigs_cluster, vecs_cluster, start_site, tlist, N)
+
+        np.testing.assert_array_almost_equal(HDs, HDs_cluster, decimal=6)
+
     def test_MHD(self):
         # Try to test the final product: the mean hamming distance as a function of time
 
@@ -235,11 +322,29 @@ class Testeigenstates(unittest.TestCase):
         exact_data = exact_MHD_hypercube(N, tlist)
         np.testing.assert_array_almost_equal(data, exact_data, decimal = 8)
 
+        # MHD uses the closed form at p = 1, so also check the numerical route against it
+        H = spr.csr_matrix(hypergraphs.hypercube_H(N, 1))
+        hd = te.realisation_HD(distributions.cluster_eigh(H, 0), tlist, N)
+        np.testing.assert_array_almost_equal(hd, exact_data, decimal = 8)
+
 
         # SECOND TEST: p = 0
         data = te.MHD(N, 0, t_max, NT, NR)
         np.testing.assert_array_equal(data, np.zeros(NT))
 
 
+        # THIRD TEST: intermediate p, from the cached cluster eigendecompositions, against
+        # diagonalising each saved H in full
+        N_coeff = 2
+        data = te.MHD(N, N_coeff, t_max, NT, NR, workers=2)
+
+        mhd = np.zeros(NT)
+        for H, _ in distributions.get_H_LC_hypercube(N, NR, N_coeff/N, DATA_PATH):
+            start_site = te.find_start_site(H, N)
+            eigs, vecs = np.linalg.eigh(H.toarray())
+            mhd += te.HD(eigs, vecs, start_site, tlist, N)
+        np.testing.assert_array_almost_equal(data, mhd/NR, decimal = 6)
+
+
 if __name__ == "__main__":
     unittest.main()
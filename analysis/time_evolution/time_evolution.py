@@ -2,9 +2,12 @@
 
 import os
 import sys
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 import numpy as np
-import hypergraphs
+from scipy import sparse as spr
 import distributions
 
 DATA_PATH = "/Users/alex/Code/Hypercubes/analysis/data/"
@@ -12,66 +15,189 @@ DATA_PATH = "/Users/alex/Code/Hypercubes/analysis/data/"
 
 def psi_0(vecs, start_site, N):
     """ The starting state in the eigenbasis of the Hamiltonian. """
-    NH = 2**N
-
-    psi = np.zeros(NH)
-    psi[start_site] = 1
-
-    return np.dot(U_T(vecs), psi)
+    # U_T @ |start_site> is just a column of U_T, i.e. a conjugated row of U
+    return U(vecs)[start_site].conj()
 
 
 def psi_t(eigs, psi0, t):
-    """ |\psi(t)> in the eigenbasis. """
+    """ |\psi(t)> in the eigenbasis. If t is an array of NT times, the states
+    for all of them are returned at once, with shape (NT, NH). """
     te_operator = TE_operator(eigs, t)
     return te_operator * psi0
 
 
 def TE_operator(eigs, t):
-    """ The time evolution operator in the eigenbasis of the hamiltonian """
-    return np.exp(-1j * t * eigs)
+    """ The time evolution operator in the eigenbasis of the hamiltonian,
+    for a single time t or (with shape (NT, NH)) an array of times. """
+    return np.exp(-1j * np.multiply.outer(t, eigs))
+
+
+@functools.lru_cache(maxsize=None)
+def popcounts(N):
+    """ The number of set bits of every site 0, ..., 2**N - 1, i.e. the Hamming
+    distances from site 0. The result is cached, and so is returned read-only. """
+    sites = np.arange(2**N, dtype=np.uint32)
+
+    # popcount of each site, vectorised (np.bitwise_count needs NumPy >= 2.0)
+    if hasattr(np, "bitwise_count"):
+        hds = np.bitwise_count(sites).astype(np.uint)
+    else:
+        hds = np.unpackbits(sites.view(np.uint8).reshape(-1, 4), axis=1).sum(axis=1, dtype=np.uint)
+
+    hds.flags.writeable = False
+    return hds
 
 
 def Hamming_distances(N, start_site):
-    """ Construct an array of Hamming distances w.r.t. a given starting site """
-    NH = 2**N
-    return np.fromiter((hypergraphs.Hamming_distance(i, start_site) for i in range(NH)), dtype=np.uint)
+    """ Construct an array of Hamming distances w.r.t. a given starting site. """
+    # d(i, start_site) = popcount(i ^ start_site): permute the per-N table rather
+    # than recounting, since start_site changes with every realisation
+    return popcounts(N)[np.arange(2**N, dtype=np.uint32) ^ np.uint32(start_site)]
 
 
 def D(vecs, start_site, N):
     """ The Hamming Distance operator in the eigenbasis. """
-    D_site_basis = np.diag(Hamming_distances(N, start_site))
-    return U_T(vecs) @ D_site_basis @ U(vecs)
+    # D is diagonal in the site basis: scale the columns of U_T rather than building diag(hds)
+    hds = Hamming_distances(N, start_site)
+    return (U_T(vecs) * hds) @ U(vecs)
 
 
 def find_start_site(H, N):
-    """ Search for the first state we can find that is in the cluster """
-    NH = 2**N
+    """ Search for the first state we can find that is in the cluster. H may be
+    dense or sparse; for a sparse H, the bonds of each row are read off the CSR
+    index pointer rather than converting to a dense matrix. """
+    if spr.issparse(H):
+        H = H.tocsr()
+        in_cluster = np.diff(H.indptr) > 0
+    else:
+        in_cluster = np.any(H != 0, axis=1)
 
-    for i in range(NH):
-        if np.sum(H[i,:]) != 0:
-            return i
-    
-    # zero matrix
-    return 0
+    sites = np.flatnonzero(in_cluster)
+    if len(sites) == 0:
+        # zero matrix
+        return 0
 
+    return int(sites[0])
 
-def HD(eigs, vecs, start_site, tlist, N):
-    """ Compute the Hamming distance of a time-evolving state,
-    given the eigenvalues and eigenvectors of a Hamiltonian. """
-    psi0 = psi_0(vecs, start_site, N)
-    D_op = D(vecs, start_site, N)
-    HDs = np.zeros(len(tlist))
 
-    for ti, t in enumerate(tlist):
-        psit = psi_t(eigs, psi0, t)
-        ham_dist = np.vdot(psit, D_op @ psit)
-        HDs[ti] = ham_dist
+def HD(eigs, vecs, start_site, tlist, N, out=None, bufs=None):
+    """ Compute the Hamming distance of a time-evolving state,
+    given the eigenvalues and eigenvectors of a Hamiltonian. The result is written
+    to out, if given. bufs, from HD_buffers, are work arrays reused between calls. """
+    levels, phi = eigenspace_projections(eigs, vecs, start_site, N)
+    hds = Hamming_distances(N, start_site)
+
+    NT, K = len(tlist), len(levels)
+    NH = phi.shape[0]
+    if bufs is None:
+        bufs = HD_buffers(NT, NH)
+
+    # |psi(t)> = sum_k c_k(t) |phi_k>, with c_k(t) = exp(-i E_k t). The (NT, K) view fills
+    # the start of the flat buffer, so that it is contiguous
+    c = bufs[0][:NT*K].reshape(NT, K)
+    np.multiply.outer(tlist, levels, out=c)
+    c *= -1j
+    np.exp(c, out=c)
+
+    if K * (NH + NT) < NT * NH:
+        # Few levels: <psi(t)|D|psi(t)> = sum_kl c_k(t)* M_kl c_l(t), where M_kl = <phi_k|D|phi_l>
+        # does not depend on t. D is diagonal in the site basis, so M is built there, once,
+        # and then each time costs K^2 rather than K * NH.
+        M = (phi.conj().T * hds) @ phi
+        cM = bufs[1][:NT*K].reshape(NT, K)
+        np.matmul(c.conj(), M, out=cM)
+
+        # sum_k (c* M)_tk c_tk, which is real as M is Hermitian
+        cM *= c
+        HDs = np.sum(cM.real, axis=1, out=out)
+    else:
+        # Otherwise, go back to the site basis, where D is diagonal:
+        # <psi(t)|D|psi(t)> = sum_i hds[i] |psi_i(t)|^2
+        psit = bufs[1].reshape(NT, NH)
+        np.matmul(c, phi.T, out=psit)
+        HDs = weighted_norms(psit, hds, out=out)
 
     return HDs
 
 
-def MHD(N, N_coeff, t_max, NT, NR, log=True):
-    """ Attempt to load the MHD data, else generate it (from saved H data) and save it."""
+def eigenspace_projections(eigs, vecs, start_site, N, tol=1e-9):
+    """ Group the (ascending) eigenvalues into distinct energy levels, within tol of each other,
+    and project the start state onto each eigenspace. Percolation clusters are highly degenerate,
+    so there are far fewer levels K than eigenvalues. Returns (levels, phi), where phi[:, k] is
+    the projection onto level k, in the site basis, with shape (NH, K). """
+    starts = np.flatnonzero(np.diff(eigs, prepend=-np.inf) > tol)
+    levels = np.add.reduceat(eigs, starts) / np.diff(starts, append=len(eigs))
+
+    # P_k |start_site> = sum_{a in k} |a><a|start_site>
+    phi = np.add.reduceat(U(vecs) * psi_0(vecs, start_site, N), starts, axis=1)
+
+    return levels, phi
+
+
+def HD_buffers(NT, NH):
+    """ Flat work arrays for HD, for NT times and a Hamiltonian of dimension NH (and so at
+    most NH energy levels). """
+    return np.empty(NT * NH, dtype=complex), np.empty(NT * NH, dtype=complex)
+
+
+def weighted_norms(psit, weights, out=None):
+    """ sum_i weights[i] * |psit[t, i]|^2 for each row t of psit. The complex array is viewed
+    as (real, imag) pairs so the square, the weighting and the sum happen in one pass. """
+    psit = np.ascontiguousarray(psit, dtype=complex)
+    parts = psit.view(np.float64).reshape(*psit.shape, 2)
+    return np.einsum('tic,tic,i->t', parts, parts, weights.astype(np.float64), out=out)
+
+
+def cluster_eigh_full_basis(H, start_site):
+    """ distributions.cluster_eigh, with the eigenvectors in the full site basis. H is
+    diagonalised on the sites of the cluster containing start_site only, as these
+    are the only sites a state starting there can reach. Returns (eigs, vecs), where vecs has
+    shape (NH, cluster size): the eigenvectors of the cluster written in the full site basis,
+    so that they can be used with psi_0, D and HD as normal. """
+    eigs, sites, vecs_cluster = distributions.cluster_eigh(H, start_site)
+    return eigs, cluster_vecs(sites, vecs_cluster, H.shape[0])
+
+
+def cluster_vecs(sites, vecs_cluster, NH):
+    """ Write eigenvectors in the basis of the sites of a cluster, as returned by
+    distributions.cluster_eigh, in the full site basis, with shape (NH, cluster size). """
+    vecs = np.zeros((NH, len(sites)), dtype=vecs_cluster.dtype)
+    vecs[sites] = vecs_cluster
+
+    return vecs
+
+
+# work arrays for HD, one set per worker process (see init_worker)
+_HD_BUFFERS = None
+
+
+def init_worker(NT, NH):
+    """ Allocate the HD work arrays once in each worker process, rather than once per realisation,
+    and limit the process to one BLAS thread (HD is dense matrix products). """
+    global _HD_BUFFERS
+    distributions.limit_BLAS_threads()
+    _HD_BUFFERS = HD_buffers(NT, NH)
+
+
+def realisation_HD(eig_data, tlist, N):
+    """ The Hamming distance of a state starting in the cluster of one realisation, for
+    each time in tlist. eig_data is the (eigs, sites, vecs) of the cluster, as returned by
+    distributions.cluster_eigh. Top-level so that it can run in a worker process. """
+    eigs, sites, vecs = eig_data
+
+    # a single-site cluster never leaves the start site, so its HD is zero
+    if len(sites) == 1:
+        return np.zeros(len(tlist))
+
+    # the lowest site of the cluster, i.e. the first site with a bond (see find_start_site)
+    start_site = sites[0]
+    return HD(eigs, cluster_vecs(sites, vecs, 2**N), start_site, tlist, N, bufs=_HD_BUFFERS)
+
+
+def MHD(N, N_coeff, t_max, NT, NR, log=True, workers=None):
+    """ Attempt to load the MHD data, else generate it (from the saved eigendecompositions
+    of the H data) and save it. The realisations are independent, and are divided between
+    `workers` processes (default: one per CPU). """
     p = N_coeff/N
     name = f"MHD_LC_hypercube_N{N}_NR{NR}_p{p:.4f}_NT{NT}_TMAX{t_max}_LOG{log}.npy"
 
@@ -83,19 +209,31 @@ def MHD(N, N_coeff, t_max, NT, NR, log=True):
         else:
             tlist = np.linspace(0, t_max, NT)
 
-        res = np.zeros(NT) # Store the result here
+        if N_coeff == N:
+            # p = 1: every realisation is the full hypercube, on which each of the N bits
+            # flips independently with probability sin^2(t), so MHD(t) = N sin^2(t)
+            res = N * np.sin(tlist)**2
+        elif N_coeff == 0:
+            # p = 0: every cluster is a single site, which the state never leaves
+            res = np.zeros(NT)
+        else:
+            res = np.zeros(NT) # Store the result here
+
+            # Load the eigendecompositions of the clusters, so that only the first MHD for
+            # given (N, NR, p) diagonalises them, whatever the time grid
+            eig_data = distributions.get_eigendecomp_LC_hypercube(N, NR, p, DATA_PATH, workers)
 
-        # Load the Hamiltonians and cluster sizes
-        H_data = distributions.get_H_LC_hypercube(N, NR, p, DATA_PATH)
+            if workers is None:
+                workers = os.cpu_count()
+            chunksize = max(1, NR // (4 * workers))
 
-        for di, data in enumerate(H_data):
-            print(f"{(di/NR)*100:.3f}% done", end='\r')
-            H = data[0].toarray()
-            start_site = find_start_site(H, N)
-            eigs, vecs = np.linalg.eigh(H)
-            res += HD(eigs, vecs, start_site, tlist, N)
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(NT, 2**N)) as pool:
+                HDs = pool.map(realisation_HD, eig_data, repeat(tlist), repeat(N), chunksize=chunksize)
+                for di, hd in enumerate(HDs):
+                    print(f"{(di/NR)*100:.3f}% done", end='\r')
+                    res += hd
 
-        res /= NR
+            res /= NR
         np.save(DATA_PATH + name, res)
     return res
 
@@ -9,34 +9,39 @@ the edges of the full graph when p=0.5. As the percolation process is random, th
 is a probability that this test could fail, if unusually many or few edges are present."""
 
 import unittest
+import functools
 import distributions
 import hypergraphs
 import numpy as np
 import os, shutil
+from multiprocessing import Pool
 from scipy.special import comb
+from scipy import sparse as spr
+from scipy.sparse.csgraph import connected_components
 import networkx as nx
-import gmpy2
 
 # where to save the temp data for testing
 DATA_PATH = "./data/testing/"
 
+# the Monte-Carlo convergence tests (NR >= 20000) only run if HYPERGRAPHS_SLOW_TESTS=1
+SLOW_TESTS = os.environ.get("HYPERGRAPHS_SLOW_TESTS") == "1"
+
 class Testdistributions(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        _cached_clusters.cache_clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        _cached_clusters.cache_clear()
+
     def setUp(self):
-        if not os.path.exists(DATA_PATH):
-            os.makedirs(DATA_PATH)
+        os.makedirs(DATA_PATH, exist_ok=True)
 
     def tearDown(self):
-        # delete the contents of the data/testing directory
-        for filename in os.listdir(DATA_PATH):
-            file_path = os.path.join(DATA_PATH, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print('Failed to delete %s. Reason: %s' % (file_path, e))
+        # delete the data/testing directory and its contents
+        shutil.rmtree(DATA_PATH, ignore_errors=True)
 
     # def test_cluster_properties(self):
 
@@ -48,82 +53,81 @@ class Testdistributions(unittest.TestCase):
     #     # first test an intermediate value of p. Check that the right
     #     # number of clusters are generated.
     #     p = 0.5
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
     #     self.assertEqual(len(cs), NR)
 
     #     # for p=0, check that all the clusters are of size 1.
     #     p = 0
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
     #     np.testing.assert_equal(cs, 1)
 
     #     # for p=1, check that all clusters span the whole graph.
     #     p = 1
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
     #     np.testing.assert_equal(cs, NH)
 
-    # def test_cluster_numbers(self):
+    def test_cluster_numbers(self):
 
-    #     # test parameters
-    #     N = 8
-    #     NH = 2**N
-    #     NR = 97
+        # test parameters
+        N = 8
+        NH = 2**N
+        NR = 97
 
-    #     # test p = 0: minimally connected
-    #     p = 0
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
-    #     s, n_s = distributions.cluster_numbers(cs)
+        # test p = 0: minimally connected
+        p = 0
+        cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
+        s, n_s = distributions.cluster_numbers(cs)
 
-    #     # for p=0, there should only be one cluster number
-    #     self.assertEqual(len(n_s), 1)
+        # for p=0, there should only be one cluster number
+        self.assertEqual(len(n_s), 1)
 
-    #     # its value should be 1, as there is one 1-cluster per lattice site
-    #     self.assertEqual(n_s[0], 1)
+        # its value should be 1, as there is one 1-cluster per lattice site
+        self.assertEqual(n_s[0], 1)
 
 
-    #     # test p = 1: maximally connected
-    #     p = 1
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
-    #     s, n_s = distributions.cluster_numbers(cs)
+        # test p = 1: maximally connected
+        p = 1
+        cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
+        s, n_s = distributions.cluster_numbers(cs)
 
-    #     # again, there should only be one cluster number, as every cluster
-    #     # is equal in size to NH, the total number of lattice nodes
-    #     self.assertEqual(len(n_s), 1)
+        # again, there should only be one cluster number, as every cluster
+        # is equal in size to NH, the total number of lattice nodes
+        self.assertEqual(len(n_s), 1)
 
-    #     # its value should be 1/NH
-    #     self.assertEqual(n_s[0], 1/NH)
+        # its value should be 1/NH
+        self.assertEqual(n_s[0], 1/NH)
 
 
-    #     # test p = 0.5
-    #     p = 0.5
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
-    #     s, n_s = distributions.cluster_numbers(cs)
+        # test p = 0.5
+        p = 0.5
+        cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
+        s, n_s = distributions.cluster_numbers(cs)
 
-    #     # for intermediate p, we check normalisation. This essentially says
-    #     # that every site is in a cluster of some size.
-    #     # for bond percolation, the rule is: \sum_s s*n_s = 1
-    #     np.testing.assert_almost_equal(np.sum([s*n_s]), 1, 4)
+        # for intermediate p, we check normalisation. This essentially says
+        # that every site is in a cluster of some size.
+        # for bond percolation, the rule is: \sum_s s*n_s = 1
+        np.testing.assert_almost_equal(np.sum([s*n_s]), 1, 4)
 
+    @unittest.skipUnless(SLOW_TESTS, "slow: set HYPERGRAPHS_SLOW_TESTS=1 to run")
+    def test_cluster_numbers_slow(self):
 
-    #     # For N = 2, test the cluster numbers against analytic results
-    #     # We need to use many realisations to achieve convergence.
+        # For N = 2, test the cluster numbers against analytic results
+        # We need to use many realisations to achieve convergence.
 
-    #     NR = 1000000
-    #     N = 2
-    #     NH = 2**N
-    #     p = 0.8
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
-    #     s, n_s = distributions.cluster_numbers(cs)
+        NR = 1000000
+        N = 2
+        NH = 2**N
+        p = 0.8
+        cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
+        s, n_s = distributions.cluster_numbers(cs)
 
 
-    #     # analytic results for cluster numbers on a square
-    #     n_1 = (1-p)**2
-    #     n_2 = p*((1-p)**2)
-    #     n_3 = (p**2)*((1-p)**2)
-    #     n_4 = p**3 - (3/4)*(p**4)
+        # analytic results for cluster numbers n_1, ..., n_4 on a square
+        expected = np.array([(1-p)**2, p*((1-p)**2), (p**2)*((1-p)**2), p**3 - (3/4)*(p**4)])
 
-    #     # aim for numerical calculations to be within one percent of the analytics.
-    #     # as this is a random process, it might sometimes fail by a small amount
-    #     np.testing.assert_allclose(np.array([n_1, n_2, n_3, n_4]), np.array([n_s[0], n_s[1], n_s[2], n_s[3]]), rtol = 0.01)
+        # aim for numerical calculations to be within one percent of the analytics.
+        # as this is a random process, it might sometimes fail by a small amount
+        np.testing.assert_allclose(n_s[:4], expected, rtol = 0.01)
 
     # def test_w_s(self):
 
@@ -134,14 +138,14 @@ class Testdistributions(unittest.TestCase):
 
     #     # test for normalisation. w_s is a probability, and so its 
     #     # values should sum to 1.
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
     #     s, w_s = distributions.w_s(cs)
     #     self.assertAlmostEqual(1, sum(w_s), places=5)
 
 
     #     # test p = 0
     #     p = 0
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
     #     s, w_s = distributions.w_s(cs)
 
     #     # when p=0, there should only be the value s=1 returned
@@ -155,7 +159,7 @@ class Testdistributions(unittest.TestCase):
 
     #     # test p = 1
     #     p = 1
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
     #     s, w_s = distributions.w_s(cs)
 
     #     # when p=1, the probability of ending up in a 2**N-cluster is 1.
@@ -172,7 +176,7 @@ class Testdistributions(unittest.TestCase):
     #     # check the result that the mean cluster size is equal to 1
     #     # when p=0.
     #     p = 0
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
     #     S = distributions.S(cs)
     #     self.assertEqual(S, 1)
 
@@ -180,7 +184,7 @@ class Testdistributions(unittest.TestCase):
     #     # when p=1, the mean cluster size should be NH = 2**N, the total number
     #     # of nodes
     #     p = 1
-    #     cs = distributions.get_clusters_hypercube(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
     #     S = distributions.S(cs)
     #     self.assertEqual(S, 2**N)
 
@@ -195,21 +199,21 @@ class Testdistributions(unittest.TestCase):
 
     #     for index in range(1, 23):
     #         N = index
-    #         cs = distributions.get_clusters_PXP(N, NR, p, DATA_PATH)
+    #         cs = cached_clusters(distributions.get_clusters_PXP, N, NR, p)
     #         np.testing.assert_equal(cs, fib(N+2))
         
     #     # check that for p=0, the cluster size should be 1
     #     NR = 16
     #     p = 0
     #     N = 12
-    #     cs = distributions.get_clusters_PXP(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_PXP, N, NR, p)
     #     np.testing.assert_equal(cs, 1)
 
     #     # check that the right number of clusters are produced for intermediate p
     #     NR = 111
     #     N = 7
     #     p = 0.25
-    #     cs = distributions.get_clusters_PXP(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_PXP, N, NR, p)
     #     self.assertEqual(len(cs), NR)
 
 
@@ -220,76 +224,79 @@ class Testdistributions(unittest.TestCase):
 
     #     # test for normalisation. w_s is a probability, and so its 
     #     # values should sum to 1.
-    #     cs = distributions.get_clusters_PXP(N, NR, p, DATA_PATH)
+    #     cs = cached_clusters(distributions.get_clusters_PXP, N, NR, p)
     #     s, w_s = distributions.w_s(cs)
     #     self.assertAlmostEqual(1, sum(w_s), places=5)
 
-    # def test_H(self):
+    def test_H(self):
 
-    #     Nlist = range(1, 11)
-    #     HS_DIM_LIST = np.power(2, Nlist)
+        Nlist = range(1, 11)
+        HS_DIM_LIST = np.power(2, Nlist)
 
 
-    #     # first test p = 1. The Hamiltonian should represent a complete hypercube
-    #     p = 1
-    #     for j in range(len(Nlist)):
-    #         N = Nlist[j]
-    #         NH = HS_DIM_LIST[j]
-    #         H = hypergraphs.hypercube_H(N, p)
+        # first test p = 1. The Hamiltonian should represent a complete hypercube
+        p = 1
+        for j in range(len(Nlist)):
+            N = Nlist[j]
+            NH = HS_DIM_LIST[j]
+            H = hypergraphs.hypercube_H(N, p)
 
-    #         # ensure that the Hamiltonian matrix has dim 2**N by 2**N
-    #         np.testing.assert_equal(H.shape, (NH, NH))
+            # ensure that the Hamiltonian matrix has dim 2**N by 2**N
+            np.testing.assert_equal(H.shape, (NH, NH))
 
-    #         # ensure that all rows and all columns sum to N
-    #         np.testing.assert_equal(np.fromiter((np.sum(row) for row in H), dtype=int), N)
-    #         np.testing.assert_equal(np.fromiter((np.sum(row) for row in H.T), dtype=int), N)
+            # ensure that all rows and all columns sum to N
+            np.testing.assert_equal(H.sum(axis=1), N)
+            np.testing.assert_equal(H.sum(axis=0), N)
 
         
-    #     # next, let's use NetworkX to check if we get a hypercube for large N
-    #     # this is INREDIBLY slow, so use it once
+        # next, let's use NetworkX to check if we get a hypercube for large N
+        # this is INREDIBLY slow, so use it once
 
-    #     N = 10
-    #     nx_hypercube = nx.hypercube_graph(N)
-    #     H = hypergraphs.hypercube_H(N, 1)
-    #     self.assertTrue(nx.is_isomorphic(nx_hypercube, nx.from_numpy_array(H)))
+        N = 10
+        nx_hypercube = nx.hypercube_graph(N)
+        H = hypergraphs.hypercube_H(N, 1)
+        self.assertTrue(nx.is_isomorphic(nx_hypercube, nx.from_numpy_array(H)))
 
 
-    #     # test p = 0: in this limit, each node is disconnected
-    #     p = 0
+        # test p = 0: in this limit, each node is disconnected
+        p = 0
 
-    #     for j in range(len(Nlist)):
-    #         N = Nlist[j]
-    #         NH = HS_DIM_LIST[j]
-    #         H = hypergraphs.hypercube_H(N, p)
+        for j in range(len(Nlist)):
+            N = Nlist[j]
+            NH = HS_DIM_LIST[j]
+            H = hypergraphs.hypercube_H(N, p)
 
-    #         # ensure that the Hamiltonian matrix has dim 2**N by 2**N
-    #         np.testing.assert_equal(H.shape, (NH, NH))
+            # ensure that the Hamiltonian matrix has dim 2**N by 2**N
+            np.testing.assert_equal(H.shape, (NH, NH))
 
-    #         # ensure that everything is just zeros!
-    #         np.testing.assert_equal(H, 0)
+            # ensure that everything is just zeros!
+            np.testing.assert_equal(H, 0)
 
         
-    #     # a couple of tests for p = 0.5
-    #     p = 0.5
+        # a couple of tests for p = 0.5
+        p = 0.5
 
-    #     for j in range(len(Nlist)):
-    #         N = Nlist[j]
-    #         NH = HS_DIM_LIST[j]
-    #         H = hypergraphs.hypercube_H(N, p)
+        for j in range(len(Nlist)):
+            N = Nlist[j]
+            NH = HS_DIM_LIST[j]
+            H = hypergraphs.hypercube_H(N, p)
 
-    #         # ensure that the Hamiltonian matrix has dim 2**N by 2**N
-    #         np.testing.assert_equal(H.shape, (NH, NH))
+            # ensure that the Hamiltonian matrix has dim 2**N by 2**N
+            np.testing.assert_equal(H.shape, (NH, NH))
 
-    #         # ensure hermiticity
-    #         np.testing.assert_array_equal(H, H.T)
+            # ensure hermiticity
+            np.testing.assert_array_equal(H, H.T)
 
         
-    #     N = 14
-    #     NH = 2**N
-    #     H = hypergraphs.hypercube_H(N, p)
+        N = 14
+        NH = 2**N
+        Hs = spr.csr_matrix(*hypergraphs.hypercube_H(N, p, sparse=True))
 
-    #     # for large N, ensure that approx. the correct number of nodes are present
-    #     np.testing.assert_almost_equal(np.sum(H)/(N*(2**N)), 0.5, decimal=1)
+        # ensure hermiticity
+        self.assertEqual((Hs != Hs.T).nnz, 0)
+
+        # for large N, ensure that approx. the correct number of nodes are present
+        np.testing.assert_almost_equal(Hs.sum()/(N*(2**N)), 0.5, decimal=1)
     
     # def test_symmetry(self):
     #     """ Here we test the symmetry of the eigenvalues. """
@@ -303,110 +310,117 @@ class Testdistributions(unittest.TestCase):
 
     #     np.testing.assert_array_almost_equal(eigs, -np.flip(eigs), decimal=10)
 
-    # def test_H_PXP(self):
+    def test_H_PXP(self):
         
-    #     """ Test the Fibonacci cube against analytic results from the 
-    #     mathematics literature. """
+        """ Test the Fibonacci cube against analytic results from the 
+        mathematics literature. """
 
 
-    #     # source: http://fare.tunes.org/files/fun/fibonacci.lisp
-    #     fib = lambda n:pow(2<<n,n+1,(4<<2*n)-(2<<n)-1)%(2<<n)
+        # source: http://fare.tunes.org/files/fun/fibonacci.lisp
+        @functools.lru_cache(maxsize=None)
+        def fib(n):
+            return pow(2<<n,n+1,(4<<2*n)-(2<<n)-1)%(2<<n)
 
-    #     def number_edges(n):
-    #         """ The number of edges a Fibonacci cube of dim N has.
-    #         see: https://www.sciencedirect.com/science/article/pii/S0012365X05002748"""
+        def number_edges(n):
+            """ The number of edges a Fibonacci cube of dim N has.
+            see: https://www.sciencedirect.com/science/article/pii/S0012365X05002748"""
 
-    #         fiblist1 = np.array([fib(i) for i in range(1, n-1)])
-    #         fiblist2 = np.array([fib(n+1-i) for i in range(1, n-1)])
-    #         num_e = fib(n+1) + np.sum(fiblist1 * fiblist2)
+            fiblist1 = np.array([fib(i) for i in range(1, n-1)])
+            fiblist2 = np.array([fib(n+1-i) for i in range(1, n-1)])
+            num_e = fib(n+1) + np.sum(fiblist1 * fiblist2)
 
-    #         return num_e
+            return num_e
 
-    #     Nlist = range(1, 11)
-    #     HS_DIM_LIST = np.array([fib(N+2) for N in Nlist])
+        Nlist = range(1, 11)
+        HS_DIM_LIST = np.array([fib(N+2) for N in Nlist])
+        EDGES = np.array([number_edges(N) for N in Nlist])
 
-    #     # first test p = 1. The Hamiltonian should represent a complete PXP graph
-    #     p = 1
-    #     for Ni, N in enumerate(Nlist):
-    #         NH = HS_DIM_LIST[Ni]
+        # first test p = 1. The Hamiltonian should represent a complete PXP graph
+        p = 1
+        for Ni, N in enumerate(Nlist):
+            NH = HS_DIM_LIST[Ni]
 
-    #         H = hypergraphs.PXP_H(N, p)
+            H = hypergraphs.PXP_H(N, p)
+            Hs = spr.csr_matrix(*hypergraphs.PXP_H(N, p, sparse=True))
 
-    #         # ensure that the Hamiltonian matrix has correct dimensions
-    #         np.testing.assert_equal(H.shape, (NH, NH))
+            # ensure that the Hamiltonian matrix has correct dimensions
+            np.testing.assert_equal(H.shape, (NH, NH))
 
-    #         # ensure that the total number of edges is correct
-    #         self.assertEqual(np.sum(H)/2, number_edges(N))
+            # ensure that the total number of edges is correct
+            self.assertEqual(Hs.sum()/2, EDGES[Ni])
 
-    #         # ensure that the matrix is Hermitian
-    #         np.testing.assert_array_equal(H, H.T)
+            # ensure that the matrix is Hermitian
+            self.assertEqual((Hs != Hs.T).nnz, 0)
 
-    #         # finally, test against Wouter's code to give independent test
-    #         wouters_H = Wouters_PXP_H(N)
-    #         np.testing.assert_array_equal(H, wouters_H)
+            # at p = 1, the dense and sparse Hamiltonians are the same graph
+            np.testing.assert_array_equal(Hs.toarray(), H)
+
+            # finally, test against Wouter's code to give independent test
+            wouters_H = Wouters_PXP_H(N)
+            np.testing.assert_array_equal(H, wouters_H)
         
-    #     p = 0
-    #     for Ni, N in enumerate(Nlist):
-    #         NH = HS_DIM_LIST[Ni]
+        p = 0
+        for Ni, N in enumerate(Nlist):
+            NH = HS_DIM_LIST[Ni]
 
-    #         H = hypergraphs.PXP_H(N, p)
+            H = hypergraphs.PXP_H(N, p)
             
-    #         # ensure that the Hamiltonian matrix has correct dimensions
-    #         np.testing.assert_equal(H.shape, (NH, NH))
+            # ensure that the Hamiltonian matrix has correct dimensions
+            np.testing.assert_equal(H.shape, (NH, NH))
 
-    #         # ensure that the total number of edges is correct
-    #         self.assertEqual(np.sum(H), 0)
+            # ensure that the total number of edges is correct
+            self.assertEqual(np.sum(H), 0)
 
-    #         # ensure that the matrix is Hermitian
-    #         np.testing.assert_array_equal(H, H.T)
+            # ensure that the matrix is Hermitian
+            np.testing.assert_array_equal(H, H.T)
 
 
-    #     p = 0.5
-    #     for Ni, N in enumerate(Nlist):
-    #         NH = HS_DIM_LIST[Ni]
+        p = 0.5
+        for Ni, N in enumerate(Nlist):
+            NH = HS_DIM_LIST[Ni]
 
-    #         H = hypergraphs.PXP_H(N, p)
+            H = hypergraphs.PXP_H(N, p)
+            Hs = spr.csr_matrix(*hypergraphs.PXP_H(N, p, sparse=True))
             
-    #         # ensure that the Hamiltonian matrix has correct dimensions
-    #         np.testing.assert_equal(H.shape, (NH, NH))
+            # ensure that the Hamiltonian matrix has correct dimensions
+            np.testing.assert_equal(H.shape, (NH, NH))
 
-    #         # ensure that the matrix is Hermitian
-    #         np.testing.assert_array_equal(H, H.T)
+            # ensure that the matrix is Hermitian
+            np.testing.assert_array_equal(H, H.T)
+            self.assertEqual((Hs != Hs.T).nnz, 0)
         
-    #     # for large enough N, ensure that we have approx. the correct number of edges
-    #     N = 20; p = 0.5
-    #     H = hypergraphs.PXP_H(N, p)
-    #     np.testing.assert_almost_equal(np.sum(H)/(2*number_edges(N)), 0.5, decimal=1)
-
-    # def test_PXP_site_generation(self):
-
-    #     def basis_states(N):
-    #         """ Construct the basis states for the PXP model. """
-    #         sites = [i for i in range(2**N) if (i & (i >> 1) == 0)]
-    #         return sites
-
-    #     # first test: manually construct sites which we KNOW are not allowed
-    #     # to be present in the PXP graph. Check that they are indeed not there.
-
-    #     # WARNING: NEXT FEW LINES ARE HARD-CODED
-    #     Nlist = np.array([2, 5, 8, 11, 13])
-    #     disallowed_sites = [[0b11],
-    #                        [0b11111, 0b10011, 0b11000], 
-    #                        [0b00001111, 0b11011010, 0b00101101], 
-    #                        [0b11010101010, 0b01101010100, 0b11101010101], 
-    #                        [0b0000011000000, 0b1110101010101, 0b1111111111111]]
-
-    #     for Ni, N in enumerate(Nlist):
-    #         sites = hypergraphs.PXP_sites(N)
-
-    #         # first check that our "bad states" are not present
-    #         bad_sites = disallowed_sites[Ni]
-    #         for bad_site in bad_sites:
-    #             self.assertTrue(bad_site not in sites)
-
-    #         # now check against the above Python function for constructing the 
-    #         # same basis states.
-    #         np.testing.assert_array_equal(sites, basis_states(N))
+        # for large enough N, ensure that we have approx. the correct number of edges.
+        # A dense H would be fib(22) x fib(22), so use the sparse one
+        N = 20; p = 0.5
+        Hs = spr.csr_matrix(*hypergraphs.PXP_H(N, p, sparse=True))
+        self.assertEqual((Hs != Hs.T).nnz, 0)
+        np.testing.assert_almost_equal(Hs.sum()/(2*number_edges(N)), 0.5, decimal=1)
+
+    def test_PXP_site_generation(self):
+
+        # first test: manually construct sites which we KNOW are not allowed
+        # to be present in the PXP graph. Check that they are indeed not there.
+
+        # WARNING: NEXT FEW LINES ARE HARD-CODED
+        Nlist = np.array([2, 5, 8, 11, 13])
+        disallowed_sites = [[0b11],
+                           [0b11111, 0b10011, 0b11000], 
+                           [0b00001111, 0b11011010, 0b00101101], 
+                           [0b11010101010, 0b01101010100, 0b11101010101], 
+                           [0b0000011000000, 0b1110101010101, 0b1111111111111]]
+
+        for Ni, N in enumerate(Nlist):
+            sites = hypergraphs.PXP_sites(N)
+
+            # first check that our "bad states" are not present
+            bad_sites = disallowed_sites[Ni]
+            for bad_site in bad_sites:
+                self.assertTrue(bad_site not in sites)
+
+            # now check against constructing the same basis states directly:
+            # the integers with no two adjacent bits set
+            a = np.arange(2**N, dtype=np.uint64)
+            np.testing.assert_array_equal(sites, a[(a & (a >> np.uint64(1))) == 0])
 
     # def test_RNG(self):
     #     """A probabilistic test, which might therefore fail with a small probability!"""
@@ -425,7 +439,7 @@ class Testdistributions(unittest.TestCase):
     #     # Test the 3-cube for p=1
     #     N = 3
     #     p = 1
-    #     distances = sorted(hypergraphs.hypercube_dijkstra(N, p))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra(N, p))
     #     cube_dists = [0,1,1,1,2,2,2,3]
     #     np.testing.assert_array_equal(distances, cube_dists)
     #     self.assertEqual(len(distances), 2**N)
@@ -433,8 +447,8 @@ class Testdistributions(unittest.TestCase):
     #     # Test for a huge cube by computing the analytic answer
     #     N = 22
     #     p = 1
-    #     distances = sorted(hypergraphs.hypercube_dijkstra(N, p))
-    #     analytic_distances = sorted(Hamming_distances_from_zero(N))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra(N, p))
+    #     analytic_distances = np.sort(Hamming_distances_from_zero(N))
     #     np.testing.assert_array_equal(distances, analytic_distances)
     #     self.assertEqual(len(distances), 2**N)
 
@@ -443,7 +457,7 @@ class Testdistributions(unittest.TestCase):
     #     # Now test p = 0
     #     N = 28
     #     p = 0
-    #     distances = sorted(hypergraphs.hypercube_dijkstra(N, p))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra(N, p))
     #     analytic_distances = [0]
     #     np.testing.assert_array_equal(distances, analytic_distances)
     #     self.assertEqual(len(distances), 1)
@@ -453,7 +467,7 @@ class Testdistributions(unittest.TestCase):
     #     # Test intermediate value of p
     #     N = 19
     #     p = 0.2
-    #     distances = sorted(hypergraphs.hypercube_dijkstra(N, p))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra(N, p))
     #     self.assertTrue(len(distances) > 1)
     #     self.assertTrue(len(distances) < 2**N)
 
@@ -469,7 +483,7 @@ class Testdistributions(unittest.TestCase):
     #     # Test N = 1: there are two states (up and down)
     #     N = 1
     #     p = 1
-    #     distances = sorted(hypergraphs.hypercube_dijkstra(N, p))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra(N, p))
     #     np.testing.assert_array_equal(distances, [0, 1])
 
     # def test_dijkstra_LC(self):
@@ -479,7 +493,7 @@ class Testdistributions(unittest.TestCase):
     #     # Test the 3-cube for p=1
     #     N = 3
     #     p = 1
-    #     distances = sorted(hypergraphs.hypercube_dijkstra_LC(N, p))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra_LC(N, p))
     #     cube_dists = [0,1,1,1,2,2,2,3]
     #     np.testing.assert_array_equal(distances, cube_dists)
     #     self.assertEqual(len(distances), 2**N)
@@ -487,8 +501,8 @@ class Testdistributions(unittest.TestCase):
     #     # Test for a huge cube by computing the analytic answer
     #     N = 16
     #     p = 1
-    #     distances = sorted(hypergraphs.hypercube_dijkstra_LC(N, p))
-    #     analytic_distances = sorted(Hamming_distances_from_zero(N))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra_LC(N, p))
+    #     analytic_distances = np.sort(Hamming_distances_from_zero(N))
     #     np.testing.assert_array_equal(distances, analytic_distances)
     #     self.assertEqual(len(distances), 2**N)
 
@@ -496,7 +510,7 @@ class Testdistributions(unittest.TestCase):
     #     # Now test p = 0
     #     N = 11
     #     p = 0
-    #     distances = sorted(hypergraphs.hypercube_dijkstra_LC(N, p))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra_LC(N, p))
     #     analytic_distances = [0]
     #     np.testing.assert_array_equal(distances, analytic_distances)
     #     self.assertEqual(len(distances), 1)
@@ -506,7 +520,7 @@ class Testdistributions(unittest.TestCase):
     #     # Test intermediate value of p
     #     N = 11
     #     p = 0.2
-    #     distances = sorted(hypergraphs.hypercube_dijkstra_LC(N, p))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra_LC(N, p))
     #     self.assertTrue(len(distances) > 1)
     #     self.assertTrue(len(distances) < 2**N)
 
@@ -521,110 +535,115 @@ class Testdistributions(unittest.TestCase):
     #     # Test N = 1: there are two states (up and down)
     #     N = 1
     #     p = 1
-    #     distances = sorted(hypergraphs.hypercube_dijkstra_LC(N, p))
+    #     distances = np.sort(hypergraphs.hypercube_dijkstra_LC(N, p))
     #     np.testing.assert_array_equal(distances, [0, 1])
 
+    @unittest.skipUnless(SLOW_TESTS, "slow: set HYPERGRAPHS_SLOW_TESTS=1 to run")
+    def test_dijkstra_LC_slow(self):
 
-    #     # An expensive test: check the average size of the max cluster for
-    #     # a particular value of N and p
+        # An expensive test: check the average size of the max cluster for
+        # a particular value of N and p
 
-    #     max_sizes_from_H = []
+        max_sizes_from_H = []
 
-    #     NR = 20000
-    #     N = 7
-    #     p = 0.3
+        NR = 20000
+        N = 7
+        p = 0.3
 
-    #     for _ in range(NR):
-    #         H = hypergraphs.hypercube_H(N, p)
-    #         max_size = max([len(comp) for comp in nx.connected_components(nx.from_numpy_array(H))])
-    #         max_sizes_from_H.append(max_size)
+        for _ in range(NR):
+            H = hypergraphs.hypercube_H(N, p)
+            _, labels = connected_components(spr.csr_matrix(H), directed=False)
+            max_size = int(np.bincount(labels).max())
+            max_sizes_from_H.append(max_size)
         
-    #     max_sizes_from_dijkstra = []
-    #     for _ in range(NR):
-    #         paths = hypergraphs.hypercube_dijkstra_LC(N, p)
-    #         max_sizes_from_dijkstra.append(len(paths))
+        max_sizes_from_dijkstra = []
+        for _ in range(NR):
+            paths = hypergraphs.hypercube_dijkstra_LC(N, p)
+            max_sizes_from_dijkstra.append(len(paths))
 
-    #     np.testing.assert_almost_equal(np.mean(max_sizes_from_dijkstra), np.mean(max_sizes_from_H), decimal=0)
+        np.testing.assert_almost_equal(np.mean(max_sizes_from_dijkstra), np.mean(max_sizes_from_H), decimal=0)
 
-    # def test_hypercube_H_SC(self):
+    def test_hypercube_H_SC(self):
 
-    #     # First check that p=1 gives the same result
-    #     Nlist = np.arange(1, 11)
-    #     p = 1
+        # First check that p=1 gives the same result
+        Nlist = np.arange(1, 11)
+        p = 1
 
-    #     for N in Nlist:
-    #         H_grown = hypergraphs.hypercube_H_SC(N, p)
-    #         H = hypergraphs.hypercube_H(N, p)
-    #         # Check that the two Hamiltonians are the same
-    #         np.testing.assert_array_equal(H, H_grown[0])
+        for N in Nlist:
+            H_grown = hypergraphs.hypercube_H_SC(N, p)
+            H = hypergraphs.hypercube_H(N, p)
+            # Check that the two Hamiltonians are the same
+            np.testing.assert_array_equal(H, H_grown[0])
 
-    #         # Check that the cluster sizes are correct
+            # Check that the cluster sizes are correct
 
-    #         NH = 2**N
-    #         self.assertEqual(H_grown[1], NH)
+            NH = 2**N
+            self.assertEqual(H_grown[1], NH)
 
 
 
-    #     # Checks for p = 0
-    #     p = 0
+        # Checks for p = 0
+        p = 0
 
-    #     for N in Nlist:
-    #         H_grown = hypergraphs.hypercube_H_SC(N, p)
-    #         np.testing.assert_array_equal(H_grown[0], 0)
-    #         self.assertEqual(H_grown[1], 1)
+        for N in Nlist:
+            H_grown = hypergraphs.hypercube_H_SC(N, p)
+            np.testing.assert_array_equal(H_grown[0], 0)
+            self.assertEqual(H_grown[1], 1)
 
 
-    #     # Checks for intermediate p
-    #     p = 0.5
+        # Checks for intermediate p
+        p = 0.5
 
-    #     for N in Nlist:
-    #         H_grown = hypergraphs.hypercube_H_SC(N, p)
-    #         # Test Hermiticity
-    #         np.testing.assert_array_equal(H_grown[0], H_grown[0].T)
-
-    #         # Check that the size of the cluster fits with the Hamiltonian
-    #         row_sum = np.sum(H_grown[0], axis=0)
-    #         size = np.sum([1 for j in row_sum if j > 0])
-    #         if size == 0:
-    #             self.assertEqual(H_grown[1], 1)
-    #         else:
-    #             self.assertEqual(size, H_grown[1])
+        for N in Nlist:
+            H_grown = hypergraphs.hypercube_H_SC(N, p)
+            # Test Hermiticity
+            np.testing.assert_array_equal(H_grown[0], H_grown[0].T)
+
+            # Check that the size of the cluster fits with the Hamiltonian
+            size = int(np.count_nonzero(H_grown[0].any(axis=0)))
+            if size == 0:
+                self.assertEqual(H_grown[1], 1)
+            else:
+                self.assertEqual(size, H_grown[1])
         
-    #     # for large N, ensure that approx. the correct number of nodes are present
-    #     N = 14
-    #     H_grown = hypergraphs.hypercube_H_SC(N, p)
-    #     np.testing.assert_almost_equal(np.sum(H_grown[0])/(N*(2**N)), p, decimal=2)
+        # for large N, ensure that approx. the correct number of nodes are present
+        N = 14
+        H_grown = hypergraphs.hypercube_H_SC(N, p)
+        np.testing.assert_almost_equal(np.sum(H_grown[0])/(N*(2**N)), p, decimal=2)
 
-    # def test_hypercube_get_H_SC(self):
-    #     N = 6
-    #     NR = 12
+    def test_hypercube_get_H_SC(self):
+        N = 6
+        NR = 12
 
-    #     # First test p = 1
-    #     p = 1
-    #     H_data = distributions.get_H_SC_hypercube(N, NR, p, DATA_PATH)
-
-    #     # Check the size of the data
-    #     self.assertEqual(len(H_data), NR)
-    #     self.assertEqual(len(H_data[0]), 2)
-
-    #     for data in H_data:
-    #         H = data[0].toarray()
-    #         size = data[1]
-    #         # Size of the cluster == NH == 2**N
-    #         self.assertEqual(size, 2**N)
-    #         # Check against whole H code
-    #         np.testing.assert_array_equal(H, hypergraphs.hypercube_H(N, p))
+        # First test p = 1
+        p = 1
+        H_data = distributions.get_H_SC_hypercube(N, NR, p, DATA_PATH)
+
+        # Check the size of the data
+        self.assertEqual(len(H_data), NR)
+        self.assertEqual(len(H_data[0]), 2)
+
+        # Compare against the whole H code, in sparse form
+        ref = spr.csr_matrix(*hypergraphs.hypercube_H(N, p, sparse=True))
+        for data in H_data:
+            size = data[1]
+            # Size of the cluster == NH == 2**N
+            self.assertEqual(size, 2**N)
+            # Every bond is present
+            self.assertEqual(data[0].nnz, N*2**N)
+            # Check against whole H code
+            self.assertEqual((data[0] != ref).nnz, 0)
         
-    #     # Now test p = 0
-    #     p = 0
-    #     H_data = distributions.get_H_SC_hypercube(N, NR, p, DATA_PATH)
-    #     for data in H_data:
-    #         H = data[0].toarray()
-    #         size = data[1]
-    #         # Size of the cluster == 1
-    #         self.assertEqual(size, 1)
-    #         # Check against whole H code
-    #         np.testing.assert_array_equal(H, hypergraphs.hypercube_H(N, p))
+        # Now test p = 0
+        p = 0
+        H_data = distributions.get_H_SC_hypercube(N, NR, p, DATA_PATH)
+        for data in H_data:
+            size = data[1]
+            # Size of the cluster == 1
+            self.assertEqual(size, 1)
+            # No bonds, as for the whole H code
+            self.assertEqual(data[0].shape, (2**N, 2**N))
+            self.assertEqual(data[0].nnz, 0)
     
     # def test_get_path_lengths_hypercube(self):
     #     N = 7
@@ -642,9 +661,10 @@ class Testdistributions(unittest.TestCase):
     #     self.assertEqual(len(lengths), NR)
 
     #     # Check clusters are correct size and compare result to analytic 
+    #     analytic_lengths = np.sort(Hamming_distances_from_zero(N))
     #     for i in range(NR): 
     #         self.assertEqual(len(lengths[i]), NH)
-    #         np.testing.assert_array_equal(sorted(lengths[i]), sorted(Hamming_distances_from_zero(N)))
+    #         np.testing.assert_array_equal(np.sort(lengths[i]), analytic_lengths)
 
 
     #     # Now check p = 0
@@ -656,70 +676,65 @@ class Testdistributions(unittest.TestCase):
 
     #     # But each cluster is of size 1, and has path length zero
     #     for i in range(NR): 
-    #         np.testing.assert_array_equal(sorted(lengths[i]), np.array([0]))
+    #         np.testing.assert_array_equal(np.sort(lengths[i]), np.array([0]))
 
-    # def test_hypercube_H_LC(self):
-    #     N = 7
-    #     NH = 2**N
+    def test_hypercube_H_LC(self):
+        N = 7
+        NH = 2**N
 
-    #     # First test p = 1
-    #     p = 1
-    #     H_LC = hypergraphs.hypercube_H_LC(N, p)
-    #     H_exact = hypergraphs.hypercube_H(N, p)
-    #     np.testing.assert_array_equal(H_LC[0], H_exact)
-    #     self.assertEqual(NH, H_LC[1])
+        # First test p = 1
+        p = 1
+        H_LC = hypergraphs.hypercube_H_LC(N, p)
+        H_exact = hypergraphs.hypercube_H(N, p)
+        np.testing.assert_array_equal(H_LC[0], H_exact)
+        self.assertEqual(NH, H_LC[1])
 
 
-    #     # Next, test p = 0
-    #     p = 0
-    #     H_LC = hypergraphs.hypercube_H_LC(N, p)
-    #     H_exact = hypergraphs.hypercube_H(N, p)
-    #     np.testing.assert_array_equal(H_LC[0], H_exact)
-    #     self.assertEqual(1, H_LC[1])
+        # Next, test p = 0
+        p = 0
+        H_LC = hypergraphs.hypercube_H_LC(N, p)
+        H_exact = hypergraphs.hypercube_H(N, p)
+        np.testing.assert_array_equal(H_LC[0], H_exact)
+        self.assertEqual(1, H_LC[1])
 
 
-    #     # Some tests for intermediate p
+        # Some tests for intermediate p
 
-    #     p = 0.3
-    #     H_LC = hypergraphs.hypercube_H_LC(N, p)
+        p = 0.3
+        H_LC = hypergraphs.hypercube_H_LC(N, p)
 
-    #     # Hermiticity
-    #     np.testing.assert_array_equal(H_LC[0], H_LC[0].T)
+        # Hermiticity
+        np.testing.assert_array_equal(H_LC[0], H_LC[0].T)
 
-    #     # Number of rows containing one or more 1 should be == NH
-    #     size_manual = np.sum([1 for row in H_LC[0] if np.sum(row) > 0])
-    #     self.assertEqual(size_manual, H_LC[1])
+        # Number of rows containing one or more 1 should be == NH
+        size_manual = int(np.count_nonzero(H_LC[0].any(axis=1)))
+        self.assertEqual(size_manual, H_LC[1])
 
-    #     # Use NetworkX to check number of connected components is one
-    #     # Cannot use nx.number_connected_components() as it counts "clusters"
-    #     # of just one site.
-    #     compts = nx.connected_components(nx.from_numpy_array(H_LC[0]))
-    #     number_clusters = 0
-    #     for comp in compts:
-    #         if len(comp) > 1: # count only components containing more than one site
-    #             number_clusters += 1
-    #     self.assertTrue(number_clusters == 1)
+        # Check number of connected components is one
+        # Cannot use the number of components alone, as it counts "clusters"
+        # of just one site.
+        _, labels = connected_components(spr.csr_matrix(H_LC[0]), directed=False)
+        # count only components containing more than one site
+        number_clusters = np.count_nonzero(np.bincount(labels) > 1)
+        self.assertTrue(number_clusters == 1)
 
-    #     # An expensive test: check the average size of the max cluster for
-    #     # a particular value of N and p
+    @unittest.skipUnless(SLOW_TESTS, "slow: set HYPERGRAPHS_SLOW_TESTS=1 to run")
+    def test_hypercube_H_LC_slow(self):
 
-    #     max_sizes_from_H = []
+        # An expensive test: check the average size of the max cluster for
+        # a particular value of N and p. The realisations are independent, so run
+        # them in parallel (set TEST_WORKERS=1 to run them serially)
 
-    #     NR = 20000
-    #     N = 7
-    #     p = 0.3
+        NR = 20000
+        N = 7
+        p = 0.3
 
-    #     for _ in range(NR):
-    #         H = hypergraphs.hypercube_H(N, p)
-    #         max_size = max([len(comp) for comp in nx.connected_components(nx.from_numpy_array(H))])
-    #         max_sizes_from_H.append(max_size)
-        
-    #     max_sizes_from_H_LC = []
-    #     for _ in range(NR):
-    #         H_LC = hypergraphs.hypercube_H_LC(N, p)
-    #         max_sizes_from_H_LC.append(H_LC[1])
+        workers = int(os.environ.get("TEST_WORKERS", os.cpu_count()))
+        with Pool(workers) as pool:
+            results = pool.map(max_cluster_sizes_trial, [(N, p, seed) for seed in range(NR)], chunksize=200)
+        max_sizes_from_H, max_sizes_from_H_LC = np.array(results).T
         
-    #     np.testing.assert_almost_equal(np.mean(max_sizes_from_H_LC), np.mean(max_sizes_from_H), decimal=0)
+        np.testing.assert_almost_equal(np.mean(max_sizes_from_H_LC), np.mean(max_sizes_from_H), decimal=0)
     
     def test_get_path_lengths_hypercube_LC(self):
 
@@ -732,15 +747,21 @@ class Testdistributions(unittest.TestCase):
 
         p = 1
         lengths = distributions.get_path_lengths_hypercube_LC(N, NR, p, DATA_PATH)
-        lengths = distributions.get_path_lengths_hypercube_LC(N, NR, p, DATA_PATH)
 
         # We should generate NR clusters
         self.assertEqual(len(lengths), NR)
 
+        # and the saved data should load back the same
+        saved = distributions.load_path_lengths(DATA_PATH + f"paths_hypercube_LC_N{N}_NR{NR}_p{p:.4f}")
+        self.assertEqual(len(saved), NR)
+        for length, saved_length in zip(lengths, saved):
+            np.testing.assert_array_equal(length, saved_length)
+
         # Check clusters are correct size and compare result to analytic 
+        analytic_lengths = np.sort(Hamming_distances_from_zero(N))
         for i in range(NR): 
             self.assertEqual(len(lengths[i]), NH)
-            np.testing.assert_array_equal(sorted(lengths[i]), sorted(Hamming_distances_from_zero(N)))
+            np.testing.assert_array_equal(np.sort(lengths[i]), analytic_lengths)
 
 
         # Now check p = 0
@@ -752,7 +773,7 @@ class Testdistributions(unittest.TestCase):
 
         # But each cluster is of size 1, and has path length zero
         for i in range(NR): 
-            np.testing.assert_array_equal(sorted(lengths[i]), np.array([0]))
+            np.testing.assert_array_equal(np.sort(lengths[i]), np.array([0]))
 
 
     def test_hypercube_get_H_LC(self):
@@ -767,71 +788,199 @@ class Testdistributions(unittest.TestCase):
         self.assertEqual(len(H_data), NR)
         self.assertEqual(len(H_data[0]), 2)
 
+        # Compare against the whole H code, in sparse form
+        ref = spr.csr_matrix(*hypergraphs.hypercube_H(N, p, sparse=True))
         for data in H_data:
-            H = data[0].toarray()
             size = data[1]
             # Size of the cluster == NH == 2**N
             self.assertEqual(size, 2**N)
+            # Every bond is present
+            self.assertEqual(data[0].nnz, N*2**N)
             # Check against whole H code
-            np.testing.assert_array_equal(H, hypergraphs.hypercube_H(N, p))
+            self.assertEqual((data[0] != ref).nnz, 0)
         
         # Now test p = 0
         p = 0
         H_data = distributions.get_H_LC_hypercube(N, NR, p, DATA_PATH)
         for data in H_data:
-            H = data[0].toarray()
             size = data[1]
             # Size of the cluster == 1
             self.assertEqual(size, 1)
-            # Check against whole H code
-            np.testing.assert_array_equal(H, hypergraphs.hypercube_H(N, p))
-    
+            # No bonds, as for the whole H code
+            self.assertEqual(data[0].shape, (2**N, 2**N))
+            self.assertEqual(data[0].nnz, 0)
+
+    def test_batch_NR(self):
+        # NR < 1 is a ValueError, including negative NR (which must not wrap to a huge unsigned NR)
+        batch_functions = [hypergraphs.hypercube_H_SC_batch, hypergraphs.hypercube_H_LC_batch,
+                           hypergraphs.hypercube_dijkstra_batch, hypergraphs.hypercube_dijkstra_LC_batch]
+        for func in batch_functions:
+            for NR in (0, -1):
+                with self.assertRaises(ValueError):
+                    func(5, NR, 0.5)
+
+    def test_hypercube_H_LC_batch(self):
+        N = 7
+        NH = 2**N
+        NR = 20
+        p = 0.3
+
+        H_data = hypergraphs.hypercube_H_LC_batch(N, NR, p)
+        self.assertEqual(len(H_data), NR)
+
+        for (csr, size) in H_data:
+            H = spr.csr_matrix(csr, shape=(NH, NH))
+            # CSR arrays as built by scipy.sparse, and H is symmetric
+            self.assertTrue(H.has_sorted_indices)
+            self.assertEqual((H != H.T).nnz, 0)
+
+            # H contains exactly one cluster (plus isolated sites), of the given size
+            n_components, labels = connected_components(H, directed=False)
+            cluster_sizes = np.bincount(labels)
+            self.assertEqual(np.max(cluster_sizes), size)
+            self.assertEqual(n_components, NH - size + 1)
+
+    def test_H_sparse(self):
+        # At p = 1 the sparse Hamiltonians should be the dense ones, in CSR format
+        for N in range(1, 9):
+            H = hypergraphs.hypercube_H(N, 1)
+            Hs = spr.csr_matrix(*hypergraphs.hypercube_H(N, 1, sparse=True))
+            self.assertTrue(Hs.has_sorted_indices)
+            np.testing.assert_array_equal(Hs.toarray(), H)
+
+            H = hypergraphs.PXP_H(N, 1)
+            Hs = spr.csr_matrix(*hypergraphs.PXP_H(N, 1, sparse=True))
+            self.assertTrue(Hs.has_sorted_indices)
+            np.testing.assert_array_equal(Hs.toarray(), H)
+
+        # Hermiticity for intermediate p
+        N = 12
+        p = 0.5
+        Hs = spr.csr_matrix(*hypergraphs.hypercube_H(N, p, sparse=True))
+        self.assertEqual((Hs != Hs.T).nnz, 0)
+        NH = len(hypergraphs.PXP_sites(N))
+        Hs = spr.csr_matrix(*hypergraphs.PXP_H(N, p, sparse=True))
+        self.assertEqual(Hs.shape, (NH, NH))
+        self.assertEqual((Hs != Hs.T).nnz, 0)
+
+        # The shape is returned too, as it cannot be inferred from H if there are no bonds
+        N = 4
+        Hs = spr.csr_matrix(*hypergraphs.hypercube_H(N, 0, sparse=True))
+        self.assertEqual(Hs.shape, (2**N, 2**N))
+        self.assertEqual(Hs.nnz, 0)
+        Hs = spr.csr_matrix(*hypergraphs.PXP_H(N, 0, sparse=True))
+        self.assertEqual(Hs.shape, (len(hypergraphs.PXP_sites(N)),)*2)
+        self.assertEqual(Hs.nnz, 0)
+
+    def test_size_counts(self):
+
+        # compare against counting with np.unique on the cluster sizes of a real run
+        N = 9
+        NR = 1000
+        p = 0.2
+        cs = cached_clusters(distributions.get_clusters_hypercube, N, NR, p)
+
+        s, counts = distributions.size_counts(cs)
+        s_unique, counts_unique = np.unique(cs, return_counts=True)
+        np.testing.assert_array_equal(s, s_unique)
+        np.testing.assert_array_equal(counts, counts_unique)
+        self.assertEqual(np.sum(counts), NR)
+
+    def test_get_eigendecomp_LC_hypercube(self):
+        N = 6
+        NR = 5
+        p = 0.4
+
+        # Generate, then load from the saved data, which should not be recomputed
+        name = DATA_PATH + f"eig_cluster_LC_hypercube_N{N}_NR{NR}_p{p:.4f}.npz"
+        eig_data = distributions.get_eigendecomp_LC_hypercube(N, NR, p, DATA_PATH)
+        mtime = os.stat(name).st_mtime_ns
+        eig_data_loaded = distributions.get_eigendecomp_LC_hypercube(N, NR, p, DATA_PATH)
+        self.assertEqual(os.stat(name).st_mtime_ns, mtime)
+        self.assertEqual(len(eig_data_loaded), NR)
+
+        H_data = distributions.get_H_LC_hypercube(N, NR, p, DATA_PATH)
+        for (eigs, sites, vecs), (eigs_loaded, sites_loaded, vecs_loaded), (H, size) in zip(eig_data, eig_data_loaded, H_data):
+            np.testing.assert_array_equal(eigs, eigs_loaded)
+            np.testing.assert_array_equal(sites, sites_loaded)
+            np.testing.assert_array_equal(vecs, vecs_loaded)
+
+            # Check that we have diagonalised the cluster of the saved H, which holds all its bonds
+            self.assertEqual(vecs.shape, (size, size))
+            H_cluster = H[sites][:, sites].toarray()
+            self.assertEqual(H_cluster.sum(), H.sum())
+            np.testing.assert_array_almost_equal(H_cluster @ vecs, vecs * eigs, decimal=10)
+
+        # If the H data is regenerated, the eigendecompositions should be recomputed to match
+        H_name = DATA_PATH + f"H_LC_hypercube_N{N}_NR{NR}_p{p:.4f}"
+        os.remove(H_name + ".npz")
+        os.remove(H_name + "_H.npz")
+        H_data = distributions.get_H_LC_hypercube(N, NR, p, DATA_PATH)
+        eig_data = distributions.get_eigendecomp_LC_hypercube(N, NR, p, DATA_PATH)
+        for (eigs, sites, vecs), (H, size) in zip(eig_data, H_data):
+            self.assertEqual(len(sites), size)
+            H_cluster = H[sites][:, sites].toarray()
+            self.assertEqual(H_cluster.sum(), H.sum())
+            np.testing.assert_array_almost_equal(H_cluster @ vecs, vecs * eigs, decimal=10)
+
 
 ###############################
 ##### ANCILLARY FUNCTIONS #####
 ###############################
 
-def Hamming_distances_from_zero(N):
-    """I.e., how many bits are set?"""
-    NH = 2**N
-    return np.fromiter((gmpy2.popcount(i) for i in range(NH)), dtype=np.uint)
+@functools.lru_cache(maxsize=None)
+def _cached_clusters(func, N, NR, p):
+    # read into memory: the saved data is deleted in tearDown
+    return np.array(func(N, NR, p, DATA_PATH))
 
-def Wouters_PXP_H(L):
-    """ Code to construct the PXP Hamiltonian courtesy of Wouter.
-    Included as an independent test against my own code. """
-    states = np.zeros((2**L, L), dtype=int)
-                            
-    for i in np.arange(2**L):
-        ibin =  np.binary_repr(i, width=L)
+def cached_clusters(func, N, NR, p):
+    """Cluster sizes from func (get_clusters_hypercube or get_clusters_PXP), generated once per
+    (func, N, NR, p) for the whole test run. Returns a copy, so tests cannot modify the cache."""
+    return _cached_clusters(func, N, NR, p).copy()
 
-        for j in np.arange(L):
-            states[i,j] = int(ibin[j])
-
-    # filter out allowed basis states
-    trig = np.zeros(2**L, dtype=int)
-
-    for i in np.arange(2**L):
-        
-        # boundary sites
-        trig[i] =  0 # obc
+def max_cluster_sizes_trial(args):
+    """One realisation for test_hypercube_H_LC_slow: the size of the largest
+    cluster, from hypercube_H (by counting components) and from hypercube_H_LC. args is
+    (N, p, seed); the RNG is seeded per trial, as forked workers share the parent's RNG state."""
+    N, p, seed = args
+    hypergraphs.RNG_seed(seed)
 
-        # bulk sites
-        for j in np.arange(L-1):
-            trig[i] = trig[i] + states[i,j] * states[i,j+1]
+    H = hypergraphs.hypercube_H(N, p)
+    _, labels = connected_components(spr.csr_matrix(H), directed=False)
+    max_size = int(np.bincount(labels).max())
 
-    states = states[np.where(trig == 0), :]
-    states = states[0]
+    return max_size, hypergraphs.hypercube_H_LC(N, p)[1]
 
+def Hamming_distances_from_zero(N):
+    """I.e., how many bits are set?"""
+    NH = 2**N
+    return popcount(np.arange(NH))
 
-    # construct Hamiltonian
-    dimH = np.shape(states)[0]
-    H = np.zeros((dimH, dimH), dtype=int)
+def popcount(a):
+    """The number of bits set in each element of an array of non-negative integers,
+    with a SWAR popcount vectorised over the whole array."""
+    a = np.asarray(a, dtype=np.uint64)
+    a = a - ((a >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    a = (a & np.uint64(0x3333333333333333)) + ((a >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    a = (a + (a >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+    return ((a * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint)
 
-    for i in np.arange(dimH):
-        for j in np.arange(i):
-            if np.sum(np.abs(states[i] - states[j])) == 1:
-                H[i,j] = 1
-                H[j,i] = 1
+def Wouters_PXP_H(L):
+    """ Code to construct the PXP Hamiltonian courtesy of Wouter.
+    Included as an independent test against my own code. """
+    # the bits of each state, most significant first
+    i = np.arange(2**L, dtype=np.int64)[:, None]
+    shifts = np.arange(L-1, -1, -1)[None, :]
+    states = ((i >> shifts) & 1).astype(int)
+
+    # filter out allowed basis states: no two adjacent bits set (obc)
+    trig = (states[:, :-1] * states[:, 1:]).sum(axis=1)
+    states = states[trig == 0]
+
+    # construct Hamiltonian: connect states which differ by a single bit flip, i.e.
+    # whose packed integers XOR to a single set bit
+    ints = states @ (1 << np.arange(L)[::-1])
+    H = (popcount(ints[:, None] ^ ints[None, :]) == 1).astype(int)
     return np.array(H)
 
 if __name__ == "__main__":
@@ -41,11 +41,15 @@ bool empty(queue *q);
 /* Hypercube functions */
 ul DFS_hypercube(stack *s, bool visited[], const float p, const ul N, const ul start_state, int *error);
 PyObject *hypercube_clusters(PyObject *self, PyObject *args);
-PyObject *hypercube_H(PyObject *self, PyObject *args);
+PyObject *hypercube_H(PyObject *self, PyObject *args, PyObject *kwargs);
 PyObject *hypercube_H_SC(PyObject *self, PyObject *args);
 PyObject *hypercube_H_LC(PyObject *self, PyObject *args);
 PyObject *hypercube_dijkstra(PyObject *self, PyObject *args);
 PyObject *hypercube_dijkstra_LC(PyObject *self, PyObject *args);
+PyObject *hypercube_H_SC_batch(PyObject *self, PyObject *args);
+PyObject *hypercube_H_LC_batch(PyObject *self, PyObject *args);
+PyObject *hypercube_dijkstra_batch(PyObject *self, PyObject *args);
+PyObject *hypercube_dijkstra_LC_batch(PyObject *self, PyObject *args);
 
 /* PXP functions */
 void populate_sites_PXP(ul *sites, ul N);
@@ -53,7 +57,7 @@ ul *construct_PXP_sitelist(ul N);
 bool PXP_flip_allowed(ul u, ul i, ul N);
 ul DFS_PXP(stack *s, ul *sites, bool visited[], const float p, const ul N, const ul start_state, int *error);
 PyObject *PXP_clusters(PyObject *self, PyObject *args);
-PyObject* PXP_H(PyObject *self, PyObject *args);
+PyObject* PXP_H(PyObject *self, PyObject *args, PyObject *kwargs);
 PyObject *PXP_sites(PyObject *self, PyObject *args);
 
 /* Maths functions */
@@ -63,11 +67,13 @@ ul index_site(ul *sites, ul site, ul left, ul right, int *idx_flag);
 ul fibonacci(ul n);
 
 /* Misc functions */
-bool check_args(ul N, ul NR, float p);
+bool check_args(ul N, long NR, float p);
 PyObject *CArrayToNumPyArray(ul *arr, ul length);
+PyObject *bonds_to_CSR(ul *bonds, ul N, ul NH, ul *sitelist, ul *labels, ul cluster_index);
 ul pyobject_to_ul(PyObject *positive_int);
 PyObject *Hamming_distance(PyObject *self, PyObject *args);
 PyObject *RNG_test(PyObject *self, PyObject *args);
+PyObject *RNG_seed(PyObject *self, PyObject *args);
 
 
 
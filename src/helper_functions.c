@@ -56,6 +56,26 @@ PyObject *RNG_test(PyObject *self, PyObject *args)
 
 }
 
+/*
+ * Function:  RNG_seed
+ * --------------------
+ * Re-seed the global RNG. The RNG is seeded from the time when the module is imported,
+ * so processes forked from the same parent would otherwise share a random stream.
+ * 
+ * seed: a non-negative integer
+ * 
+ * returns: None
+ */
+PyObject *RNG_seed(PyObject *self, PyObject *args)
+{
+    unsigned long seed;
+
+    if (!PyArg_ParseTuple(args, "k", &seed)) return NULL;
+    gsl_rng_set(RNG, seed);
+
+    Py_RETURN_NONE;
+}
+
 /*
  * Function:  CArrayToNumPyArray
  * --------------------
@@ -80,6 +100,98 @@ PyObject *CArrayToNumPyArray(ul *arr, ul length)
     return numpy_array;
 }
 
+/*
+ * Function:  bonds_to_CSR
+ * --------------------
+ * Build the (data, indices, indptr) arrays of the CSR format used by scipy.sparse for a
+ * Hamiltonian whose bonds are recorded as bitmasks: bit i of bonds[j] is set if site j is
+ * connected to the site found by flipping bit i. This is O(NH * N), and no dense Hamiltonian
+ * is ever created.
+ *
+ * bonds: pointer to an array of uls, the bonds of each site
+ * N: the dimension of the graph (number of bits)
+ * NH: the number of sites
+ * sitelist: pointer to the ordered list of sites (e.g. for the PXP model), in which case
+ *           j is an index into sitelist, or NULL if site j is just j (the hypercube)
+ * labels: pointer to an array of uls, the cluster label of each site, or NULL to include
+ *         all sites
+ * cluster_index: the label of the cluster to include, if labels is not NULL
+ *
+ * returns: a tuple (data, indices, indptr) of NumPy arrays, or NULL on failure.
+ */
+PyObject *bonds_to_CSR(ul *bonds, ul N, ul NH, ul *sitelist, ul *labels, ul cluster_index)
+{
+    PyArrayObject *data = NULL, *indices = NULL, *indptr = NULL;
+    int error = 0;
+
+    // First count the non-zero elements
+    npy_intp nnz = 0;
+    for (ul j = 0; j < NH; j++)
+    {
+        if (labels && labels[j] != cluster_index) continue;
+        for (ul i = 0; i < N; i++)
+        {
+            if (bonds[j] & (1UL << i)) nnz++;
+        }
+    }
+
+    npy_intp dims_data[1] = {nnz};
+    npy_intp dims_indptr[1] = {NH + 1};
+    data = (PyArrayObject *) PyArray_SimpleNew(1, dims_data, NPY_INT);
+    indices = (PyArrayObject *) PyArray_SimpleNew(1, dims_data, NPY_INTP);
+    indptr = (PyArrayObject *) PyArray_SimpleNew(1, dims_indptr, NPY_INTP);
+    if (!data || !indices || !indptr)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "Unable to create NumPy arrays in bonds_to_CSR");
+        goto error;
+    }
+
+    int *data_ptr = (int *) PyArray_DATA(data);
+    npy_intp *indices_ptr = (npy_intp *) PyArray_DATA(indices);
+    npy_intp *indptr_ptr = (npy_intp *) PyArray_DATA(indptr);
+
+    npy_intp k = 0;
+    ul u, v;
+    for (ul j = 0; j < NH; j++)
+    {
+        indptr_ptr[j] = k;
+        if (labels && labels[j] != cluster_index) continue;
+
+        u = sitelist ? sitelist[j] : j;
+        // Write the columns in ascending order. The neighbours below u are found by
+        // clearing its set bits (highest first), those above by setting its unset bits.
+        for (ul i = N; i-- > 0;)
+        {
+            if ((u & (1UL << i)) && (bonds[j] & (1UL << i)))
+            {
+                v = u ^ (1UL << i);
+                data_ptr[k] = 1;
+                indices_ptr[k++] = sitelist ? index_site(sitelist, v, 0, NH-1, &error) : v;
+            }
+        }
+        for (ul i = 0; i < N; i++)
+        {
+            if (!(u & (1UL << i)) && (bonds[j] & (1UL << i)))
+            {
+                v = u ^ (1UL << i);
+                data_ptr[k] = 1;
+                indices_ptr[k++] = sitelist ? index_site(sitelist, v, 0, NH-1, &error) : v;
+            }
+        }
+        if (error) goto error;
+    }
+    indptr_ptr[NH] = k;
+
+    // "N" steals the references to the arrays
+    return Py_BuildValue("(NNN)", data, indices, indptr);
+
+    error:
+        Py_XDECREF(data);
+        Py_XDECREF(indices);
+        Py_XDECREF(indptr);
+        return NULL;
+}
+
 /*
  * Function:  pyobject_to_ul
  * --------------------
@@ -115,12 +227,13 @@ ul pyobject_to_ul(PyObject *positive_int)
  * check user arguments N, NR and p.
  *
  * N: the dimension of the hypercube: 1 <= N <= 32
- * NR: the Number of Realisations: number of clusters to grow. NR >= 1
+ * NR: the Number of Realisations: number of clusters to grow. NR >= 1. Signed, so that
+ *     a negative NR (parsed as an int) is rejected rather than wrapping to a huge ul
  * p: the percolation concentration. 0 <= p <= 1
  *
  * returns: true if arguments are OK, else false.
  */
-bool check_args(ul N, ul NR, float p)
+bool check_args(ul N, long NR, float p)
 {
     if (N < 1 || N > 32)
     {
@@ -296,6 +296,261 @@ PyObject *hypercube_dijkstra(PyObject *self, PyObject *args)
         return NULL;
 }
 
+/*
+ * Static function:  copy_distances
+ * --------------------
+ * Helper function used in hypercube_dijkstra_batch and hypercube_dijkstra_LC_batch. Copy the
+ * distances of the sites in one cluster into a new NumPy array.
+ *
+ * distances: a pointer to an array of uls of the distances found by Dijkstra
+ * NH: the number of sites in the hypercube
+ * labels: pointer to an array of uls, the cluster label of each site
+ * cluster_index: the label of the cluster to copy
+ * size: the size of the cluster
+ *
+ * returns: a pointer to the Ndarray, or NULL on failure.
+ */
+static PyObject *copy_distances(ul *distances, ul NH, ul *labels, ul cluster_index, ul size)
+{
+    npy_intp dims[] = {size};
+    PyObject *numpy_array = PyArray_SimpleNew(1, dims, NPY_ULONGLONG);
+    if (!numpy_array)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "Error: Unable to create NumPy array in copy_distances.");
+        return NULL;
+    }
+
+    ul *array_ptr = (ul *) PyArray_DATA((PyArrayObject *) numpy_array);
+    for (ul i = 0, counter = 0; i < NH; i++)
+    {
+        if (labels[i] == cluster_index)
+        {
+            array_ptr[counter] = distances[i];
+            counter++;
+        }
+    }
+
+    return numpy_array;
+}
+
+/*
+ * Function:  hypercube_dijkstra_batch
+ * --------------------
+ * Run Dijkstra's algorithm from the root (0) site of NR realisations of the Hypercube
+ * (as in hypercube_dijkstra) in one call. The queue, visited, distances and labels arrays
+ * are allocated once and reused for every realisation.
+ *
+ * N: the dimension of the hypercube
+ * NR: the Number of Realisations
+ * p: the percolation concentration
+ *
+ * returns: a list of NR Ndarrays, each of the distances to the sites in the cluster containing 0.
+ */
+PyObject *hypercube_dijkstra_batch(PyObject *self, PyObject *args)
+{
+    PyObject *py_N = NULL; // N as a Python object
+    ul N; // hypercube dimension
+    int NR; // Number of Realisations
+    float p; // percolation concentration
+
+    queue *q = NULL;
+    bool *visited = NULL;
+    ul *distances = NULL;
+    ul *labels = NULL;
+    PyObject *result = NULL;
+
+    if (!PyArg_ParseTuple(args, "Oif", &py_N, &NR, &p)) goto error;
+    N = pyobject_to_ul(py_N);
+
+    // Check for overflow or invalid arguments
+    if (PyErr_Occurred() || !check_args(N, NR, p)) goto error;
+
+    // the size of the graph
+    ul NH = intpower(2, N);
+
+    q = setup_queue(NH);
+    if (!q) goto error;
+
+    visited = malloc(sizeof(bool)*NH);
+    distances = malloc(sizeof(ul)*NH);
+    labels = malloc(sizeof(ul)*NH);
+    if (!visited || !distances || !labels)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "Error setting up visited, distances and labels");
+        goto error;
+    }
+
+    result = PyList_New(NR);
+    if (!result) goto error;
+
+    for (int r = 0; r < NR; r++)
+    {
+        reset_visited(visited, NH);
+        for (ul i = 0; i < NH; i++)
+        {
+            distances[i] = ULONG_MAX;
+            labels[i] = ULONG_MAX;
+        }
+
+        ul number_visited = 0;
+        distances[0] = 0;
+        dijkstra(q, N, p, 0, visited, distances, &number_visited, 0, labels);
+        if (PyErr_Occurred())
+        {
+            // dijkstra has already freed these
+            q = NULL;
+            visited = NULL;
+            distances = NULL;
+            goto error;
+        }
+
+        PyObject *pathlengths = copy_distances(distances, NH, labels, 0, number_visited);
+        if (!pathlengths) goto error;
+        PyList_SET_ITEM(result, r, pathlengths);
+    }
+
+    free(q->sites);
+    free(q);
+    free(visited);
+    free(distances);
+    free(labels);
+
+    return result;
+
+    error:
+        Py_XDECREF(result);
+        if (q)
+        {
+            free(q->sites);
+            free(q);
+        }
+        if (visited) free(visited);
+        if (distances) free(distances);
+        if (labels) free(labels);
+        return NULL;
+}
+
+/*
+ * Function:  hypercube_dijkstra_LC_batch
+ * --------------------
+ * Run Dijkstra's algorithm within the LARGEST cluster of NR realisations of the Hypercube
+ * (as in hypercube_dijkstra_LC) in one call. The queue, visited, distances and labels
+ * arrays are allocated once and reused for every realisation.
+ *
+ * N: the dimension of the hypercube
+ * NR: the Number of Realisations
+ * p: the percolation concentration
+ *
+ * returns: a list of NR Ndarrays, each of the distances to the sites in the largest cluster.
+ */
+PyObject *hypercube_dijkstra_LC_batch(PyObject *self, PyObject *args)
+{
+    PyObject *py_N = NULL; // N as a Python object
+    ul N; // hypercube dimension
+    int NR; // Number of Realisations
+    float p; // percolation concentration
+
+    queue *q = NULL;
+    bool *visited = NULL;
+    ul *distances = NULL;
+    ul *labels = NULL;
+    PyObject *result = NULL;
+
+    if (!PyArg_ParseTuple(args, "Oif", &py_N, &NR, &p)) goto error;
+    N = pyobject_to_ul(py_N);
+
+    // Check for overflow or invalid arguments
+    if (PyErr_Occurred() || !check_args(N, NR, p)) goto error;
+
+    // the size of the graph
+    ul NH = intpower(2, N);
+
+    q = setup_queue(NH);
+    if (!q) goto error;
+
+    visited = malloc(sizeof(bool)*NH);
+    distances = malloc(sizeof(ul)*NH);
+    labels = malloc(sizeof(ul)*NH);
+    if (!visited || !distances || !labels)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "Error setting up visited, distances and labels");
+        goto error;
+    }
+
+    result = PyList_New(NR);
+    if (!result) goto error;
+
+    for (int r = 0; r < NR; r++)
+    {
+        reset_visited(visited, NH);
+        // Set labels to ULONG_MAX in case of early exit after first cluster
+        for (ul i = 0; i < NH; i++)
+        {
+            distances[i] = ULONG_MAX;
+            labels[i] = ULONG_MAX;
+        }
+
+        ul largest_cluster_index = 0;
+        ul largest_cluster_size = 0;
+        ul cluster_index = 0;
+        ul total_size = 0;
+        ul cluster_size;
+
+        for (ul site = 0; site < NH; site++)
+        {
+            if (!visited[site])
+            {
+                cluster_size = 0;
+                distances[site] = 0;
+                dijkstra(q, N, p, site, visited, distances, &cluster_size, cluster_index, labels);
+                if (PyErr_Occurred())
+                {
+                    // dijkstra has already freed these
+                    q = NULL;
+                    visited = NULL;
+                    distances = NULL;
+                    goto error;
+                }
+
+                total_size += cluster_size;
+                if (cluster_size > largest_cluster_size)
+                {
+                    largest_cluster_size = cluster_size;
+                    largest_cluster_index = cluster_index;
+                }
+                cluster_index++;
+
+                // early exit condition
+                if (largest_cluster_size >= NH - total_size) break;
+            }
+        }
+
+        PyObject *pathlengths = copy_distances(distances, NH, labels, largest_cluster_index, largest_cluster_size);
+        if (!pathlengths) goto error;
+        PyList_SET_ITEM(result, r, pathlengths);
+    }
+
+    free(q->sites);
+    free(q);
+    free(visited);
+    free(distances);
+    free(labels);
+
+    return result;
+
+    error:
+        Py_XDECREF(result);
+        if (q)
+        {
+            free(q->sites);
+            free(q);
+        }
+        if (visited) free(visited);
+        if (distances) free(distances);
+        if (labels) free(labels);
+        return NULL;
+}
+
 /*
  * Static function:  grow_H_cluster
  * --------------------
@@ -608,6 +863,280 @@ PyObject *hypercube_H_SC(PyObject *self, PyObject *args)
         return NULL;
 }
 
+/*
+ * Static function:  grow_bond_cluster
+ * --------------------
+ * Helper function used in hypercube_H_SC_batch and hypercube_H_LC_batch. As grow_H_cluster, but
+ * rather than writing the cluster into a dense (NH x NH) Hamiltonian, the bonds of each site u are
+ * recorded as the bits of bonds[u]: bit i is set if u is connected to u ^ (1 << i). Unlike
+ * grow_H_cluster, nothing is freed on failure; the error flag is set and the caller cleans up.
+ *
+ * N: the dimension of the hypercube
+ * p: the percolation concentration
+ * size: a pointer to an ul in which we put the cluster size
+ * s: pointer to an empty stack
+ * start_state: hypercube node from which to grow the cluster
+ * bonds: pointer to an array of uls (zeroed), in which to record the bonds of each site
+ * visited: an array of bools, marking each site as visited (true) or unvisited (false)
+ * error_flag: pointer to an integer used to flag errors
+ * cluster_index: ul used to label each site in the cluster we are about to create
+ * labels: pointer to an array of uls which we use to keep track of the cluster labels of each site
+ *
+ */
+static void grow_bond_cluster(const ul N, const float p, ul *size, stack *s, const ul start_state, ul *bonds, bool visited[], int *error_flag, ul cluster_index, ul *labels)
+{
+    ul u, v;
+
+    if (s->top != 0)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "Error in DFS algorithm! Stack not empty.");
+        *error_flag = -1;
+        return;
+    }
+    push(s, start_state);
+
+    while (s->top > 0)
+    {
+        u = pop(s, error_flag);
+        if (*error_flag == -1) return;
+
+        if (visited[u]) continue;
+        visited[u] = true;
+        labels[u] = cluster_index;
+        (*size)++;
+
+        for (ul i = 0; i < N; i++)
+        {
+            // flip the ith bit
+            v = u ^ (1UL << i);
+
+            // with probability p, create a link
+            if (!visited[v] && (gsl_rng_uniform(RNG) < p))
+            {
+                if (push(s, v) == 1)
+                {
+                    *error_flag = -1;
+                    return;
+                }
+                bonds[u] |= 1UL << i;
+                bonds[v] |= 1UL << i; // hermiticity!
+            }
+        }
+    }
+}
+
+/* Function: hypercube_H_SC_batch
+ * ----------------------
+ * Construct the Hamiltonian matrices for NR single clusters of the Hypercube (each grown
+ * from site 0, as in hypercube_H_SC) in one call. The stack and the visited, labels and
+ * bonds arrays are allocated once and reused for every realisation. Each Hamiltonian is
+ * built in, and returned in, CSR format.
+ *
+ * N : the dimension of the hypercube
+ * NR: the Number of Realisations
+ * p: the percolation concentration
+ *
+ * returns: a list of NR tuples ((data, indices, indptr), size), where (data, indices, indptr)
+ * are the CSR arrays of the (2**N x 2**N) Hamiltonian and size is the size of the cluster.
+*/
+PyObject *hypercube_H_SC_batch(PyObject *self, PyObject *args)
+{
+    PyObject *py_N = NULL; // N as a Python object
+    ul N; // hypercube dimension
+    int NR; // Number of Realisations
+    float p; // percolation concentration
+
+    stack *s = NULL;
+    bool *visited = NULL;
+    ul *labels = NULL;
+    ul *bonds = NULL;
+    PyObject *result = NULL;
+
+    if (!PyArg_ParseTuple(args, "Oif", &py_N, &NR, &p)) goto error;
+
+    N = pyobject_to_ul(py_N);
+    // Check for overflow or invalid arguments
+    if (PyErr_Occurred() || !check_args(N, NR, p)) goto error;
+
+    ul NH = intpower(2, N);
+
+    s = setup_stack(NH);
+    if (!s) goto error;
+
+    visited = malloc(sizeof(bool)*NH);
+    labels = malloc(sizeof(ul)*NH);
+    bonds = malloc(sizeof(ul)*NH);
+    if (!visited || !labels || !bonds)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "Error setting up visited, labels and bonds");
+        goto error;
+    }
+
+    result = PyList_New(NR);
+    if (!result) goto error;
+
+    int error_flag = 0;
+    for (int r = 0; r < NR; r++)
+    {
+        reset_visited(visited, NH);
+        for (ul i = 0; i < NH; i++)
+        {
+            labels[i] = ULONG_MAX;
+            bonds[i] = 0;
+        }
+
+        ul size = 0;
+        grow_bond_cluster(N, p, &size, s, 0, bonds, visited, &error_flag, 0, labels);
+        if (error_flag == -1) goto error;
+
+        PyObject *csr = bonds_to_CSR(bonds, N, NH, NULL, labels, 0);
+        if (!csr) goto error;
+
+        // "N" steals the reference to csr
+        PyObject *item = Py_BuildValue("(Nk)", csr, size);
+        if (!item) goto error;
+        PyList_SET_ITEM(result, r, item);
+    }
+
+    free(s->sites);
+    free(s);
+    free(visited);
+    free(labels);
+    free(bonds);
+
+    return result;
+
+    error:
+        Py_XDECREF(result);
+        if (s)
+        {
+            free(s->sites);
+            free(s);
+        }
+        if (visited) free(visited);
+        if (labels) free(labels);
+        if (bonds) free(bonds);
+        return NULL;
+}
+
+/* Function: hypercube_H_LC_batch
+ * ----------------------
+ * Construct the Hamiltonian matrices for the LARGEST cluster of NR realisations of the
+ * Hypercube (as in hypercube_H_LC) in one call. The stack and the visited, labels and
+ * bonds arrays are allocated once and reused for every realisation. Each Hamiltonian is
+ * built in, and returned in, CSR format.
+ *
+ * N : the dimension of the hypercube
+ * NR: the Number of Realisations
+ * p: the percolation concentration
+ *
+ * returns: a list of NR tuples ((data, indices, indptr), size), where (data, indices, indptr)
+ * are the CSR arrays of the (2**N x 2**N) Hamiltonian and size is the size of the cluster.
+*/
+PyObject *hypercube_H_LC_batch(PyObject *self, PyObject *args)
+{
+    PyObject *py_N = NULL; // N as a Python object
+    ul N; // hypercube dimension
+    int NR; // Number of Realisations
+    float p; // percolation concentration
+
+    stack *s = NULL;
+    bool *visited = NULL;
+    ul *labels = NULL;
+    ul *bonds = NULL;
+    PyObject *result = NULL;
+
+    if (!PyArg_ParseTuple(args, "Oif", &py_N, &NR, &p)) goto error;
+
+    N = pyobject_to_ul(py_N);
+    // Check for overflow or invalid arguments
+    if (PyErr_Occurred() || !check_args(N, NR, p)) goto error;
+
+    ul NH = intpower(2, N);
+
+    s = setup_stack(NH);
+    if (!s) goto error;
+
+    visited = malloc(sizeof(bool)*NH);
+    labels = malloc(sizeof(ul)*NH);
+    bonds = malloc(sizeof(ul)*NH);
+    if (!visited || !labels || !bonds)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "Error setting up visited, labels and bonds");
+        goto error;
+    }
+
+    result = PyList_New(NR);
+    if (!result) goto error;
+
+    int error_flag = 0;
+    for (int r = 0; r < NR; r++)
+    {
+        reset_visited(visited, NH);
+        // Set labels to ULONG_MAX in case of early exit after first cluster
+        for (ul i = 0; i < NH; i++)
+        {
+            labels[i] = ULONG_MAX;
+            bonds[i] = 0;
+        }
+
+        ul largest_cluster_index = 0;
+        ul largest_cluster_size = 0;
+        ul cluster_index = 0;
+        ul total_size = 0;
+        ul cluster_size;
+
+        for (ul site = 0; site < NH; site++)
+        {
+            if (!visited[site])
+            {
+                cluster_size = 0;
+                grow_bond_cluster(N, p, &cluster_size, s, site, bonds, visited, &error_flag, cluster_index, labels);
+                if (error_flag == -1) goto error;
+
+                total_size += cluster_size;
+                if (cluster_size > largest_cluster_size)
+                {
+                    largest_cluster_size = cluster_size;
+                    largest_cluster_index = cluster_index;
+                }
+                cluster_index++;
+
+                // early exit condition
+                if (largest_cluster_size >= NH - total_size) break;
+            }
+        }
+
+        PyObject *csr = bonds_to_CSR(bonds, N, NH, NULL, labels, largest_cluster_index);
+        if (!csr) goto error;
+
+        // "N" steals the reference to csr
+        PyObject *item = Py_BuildValue("(Nk)", csr, largest_cluster_size);
+        if (!item) goto error;
+        PyList_SET_ITEM(result, r, item);
+    }
+
+    free(s->sites);
+    free(s);
+    free(visited);
+    free(labels);
+    free(bonds);
+
+    return result;
+
+    error:
+        Py_XDECREF(result);
+        if (s)
+        {
+            free(s->sites);
+            free(s);
+        }
+        if (visited) free(visited);
+        if (labels) free(labels);
+        if (bonds) free(bonds);
+        return NULL;
+}
+
 /*
  * Function:  H_hypercube
  * --------------------
@@ -615,17 +1144,22 @@ PyObject *hypercube_H_SC(PyObject *self, PyObject *args)
  *
  * N: the dimension of the hypercube
  * p: the percolation concentration
+ * sparse: (optional keyword) if true, return H in CSR format instead
  *
- * returns: a pointer to the Ndarray (Hamiltonian matrix).
+ * returns: a pointer to the Ndarray (Hamiltonian matrix), or if sparse, a tuple
+ * ((data, indices, indptr), (NH, NH)) of the CSR arrays and the shape of H, such that
+ * scipy.sparse.csr_matrix(*H) is the Hamiltonian.
  */
-PyObject *hypercube_H(PyObject *self, PyObject *args)
+PyObject *hypercube_H(PyObject *self, PyObject *args, PyObject *kwargs)
 {
     
     PyObject *py_N = NULL; // N as a Python object
     ul N; // hypercube dimension
     float p; // percolation concentration
+    int sparse = 0; // return H in CSR format
+    static char *kwlist[] = {"N", "p", "sparse", NULL};
 
-    if (!PyArg_ParseTuple(args, "Of", &py_N, &p)) goto error;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Of|p", kwlist, &py_N, &p, &sparse)) goto error;
 
     N = pyobject_to_ul(py_N);
     // Check for overflow
@@ -634,6 +1168,36 @@ PyObject *hypercube_H(PyObject *self, PyObject *args)
     // the size of the graph
     ul NH = intpower(2, N); 
 
+    if (sparse)
+    {
+        // record the bonds of each site as a bitmask, drawing each bond once
+        ul *bonds = calloc(NH, sizeof(ul));
+        if (!bonds)
+        {
+            PyErr_SetString(PyExc_RuntimeError, "Error setting up bonds");
+            return NULL;
+        }
+        for (ul row = 0; row < NH; row++)
+        {
+            for (ul i = 0; i < N; i++)
+            {
+                ul col = row ^ (1UL << i);
+                if (col > row && gsl_rng_uniform(RNG) < p)
+                {
+                    bonds[row] |= 1UL << i;
+                    bonds[col] |= 1UL << i; // hermiticity!
+                }
+            }
+        }
+
+        PyObject *csr = bonds_to_CSR(bonds, N, NH, NULL, NULL, 0);
+        free(bonds);
+        if (!csr) return NULL;
+
+        // include the shape, which scipy cannot infer if the last columns have no bonds
+        return Py_BuildValue("(N(kk))", csr, NH, NH);
+    }
+
     // Create a new NumPy array of integers with the same dimensions
     npy_intp dimensions[2] = {NH, NH};
     PyArrayObject *numpy_array = (PyArrayObject *) PyArray_ZEROS(2, dimensions, NPY_INT, 0);
@@ -13,15 +13,20 @@ static PyObject *version(PyObject *self)
 static PyMethodDef myMethods[] = {
     {"hypercube_clusters", hypercube_clusters, METH_VARARGS, "Computes the sizes of NR clusters on a hypercube of dimension N with concentration p."},
     {"PXP_clusters", PXP_clusters, METH_VARARGS, "Computes the sizes of NR clusters on a PXP graph (Fibonacci cube) of dimension N with concentration p."},
-    {"hypercube_H", hypercube_H, METH_VARARGS, "Compute the Hamiltonian for the Hypercube with concentration p."},
+    {"hypercube_H", (PyCFunction)(void(*)(void)) hypercube_H, METH_VARARGS | METH_KEYWORDS, "Compute the Hamiltonian for the Hypercube with concentration p. With sparse=True, return it as ((data, indices, indptr), shape), for scipy.sparse.csr_matrix(*H)."},
     {"hypercube_H_SC", hypercube_H_SC, METH_VARARGS, "Compute the Hamiltonian for a single cluster of the Hypercube with concentration p."},
     {"hypercube_H_LC", hypercube_H_LC, METH_VARARGS, "Compute the Hamiltonian for the LARGEST cluster of the Hypercube with concentration p."},
     {"hypercube_dijkstra", hypercube_dijkstra, METH_VARARGS, "Compute the shortest paths between site 0 and all other sites in the same cluster"},
     {"hypercube_dijkstra_LC", hypercube_dijkstra_LC, METH_VARARGS, "Compute the shortest paths within the largest cluster"},
-    {"PXP_H", PXP_H, METH_VARARGS, "Compute the Hamiltonian for the PXP model with concentration p."},
+    {"hypercube_H_SC_batch", hypercube_H_SC_batch, METH_VARARGS, "Compute the Hamiltonians (in CSR format) for NR single clusters of the Hypercube with concentration p."},
+    {"hypercube_H_LC_batch", hypercube_H_LC_batch, METH_VARARGS, "Compute the Hamiltonians (in CSR format) for the LARGEST clusters of NR Hypercubes with concentration p."},
+    {"hypercube_dijkstra_batch", hypercube_dijkstra_batch, METH_VARARGS, "Compute the shortest paths from site 0 within its cluster, for NR realisations"},
+    {"hypercube_dijkstra_LC_batch", hypercube_dijkstra_LC_batch, METH_VARARGS, "Compute the shortest paths within the largest cluster, for NR realisations"},
+    {"PXP_H", (PyCFunction)(void(*)(void)) PXP_H, METH_VARARGS | METH_KEYWORDS, "Compute the Hamiltonian for the PXP model with concentration p. With sparse=True, return it as ((data, indices, indptr), shape), for scipy.sparse.csr_matrix(*H)."},
     {"PXP_sites", PXP_sites, METH_VARARGS, "Return an array containing the basis sites/nodes of the PXP graph."},
     {"Hamming_distance", Hamming_distance, METH_VARARGS, "Return the Hamming distance between two integers."},
     {"RNG_test", RNG_test, METH_NOARGS, "Return a random int between 0 and INT_MAX"},
+    {"RNG_seed", RNG_seed, METH_VARARGS, "Re-seed the RNG with a non-negative integer."},
     {"version", (PyCFunction) version, METH_NOARGS, "returns the version."},
     {NULL, NULL, 0, NULL}
 };
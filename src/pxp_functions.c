@@ -49,20 +49,30 @@ error:
  *
  * N: the dimension of the Fibonacci cube
  * p: the percolation concentration
+ * sparse: (optional keyword) if true, return H in CSR format instead
  *
- * returns: a pointer to the Ndarray (Hamiltonian matrix).
+ * returns: a pointer to the Ndarray (Hamiltonian matrix), or if sparse, a tuple
+ * ((data, indices, indptr), (NH, NH)) of the CSR arrays and the shape of H, such that
+ * scipy.sparse.csr_matrix(*H) is the Hamiltonian.
  */
-PyObject *PXP_H(PyObject *self, PyObject *args)
+PyObject *PXP_H(PyObject *self, PyObject *args, PyObject *kwargs)
 {
 
     PyObject *py_N = NULL; // N as a Python object
     ul N; // Fibonacci cube dimension
     float p; // percolation concentration
+    int sparse = 0; // return H in CSR format
+    static char *kwlist[] = {"N", "p", "sparse", NULL};
+
+    // freed on error
+    ul *sitelist = NULL;
+    ul *bonds = NULL;
+    PyArrayObject *numpy_array = NULL;
 
     // parse and check arguments
-    if (!PyArg_ParseTuple(args, "Of", &py_N, &p)) 
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Of|p", kwlist, &py_N, &p, &sparse)) 
     {
-        PyErr_SetString(PyExc_ValueError, "Invalid input arguments in H_PXP(N, p)");
+        PyErr_SetString(PyExc_ValueError, "Invalid input arguments in H_PXP(N, p, sparse=False)");
         goto error;
     }
     N = pyobject_to_ul(py_N);
@@ -73,16 +83,57 @@ PyObject *PXP_H(PyObject *self, PyObject *args)
     ul NH = fibonacci(N+2);
 
     // a list of the PXP sites
-    ul *sitelist = construct_PXP_sitelist(N);
+    sitelist = construct_PXP_sitelist(N);
     if (!sitelist) goto error;
 
+    if (sparse)
+    {
+        // record the bonds of each site as a bitmask, drawing each bond once
+        bonds = calloc(NH, sizeof(ul));
+        if (!bonds)
+        {
+            PyErr_SetString(PyExc_RuntimeError, "Error setting up bonds");
+            goto error;
+        }
+
+        int error = 0;
+        for (ul j = 0; j < NH; j++)
+        {
+            ul row = sitelist[j];
+            for (ul i = 0; i < N; i++)
+            {
+                ul flipped = row ^ (1UL << i);
+                if (flipped > row && PXP_flip_allowed(row, i, N) && gsl_rng_uniform(RNG) < p)
+                {
+                    ul col_index = index_site(sitelist, flipped, 0, NH-1, &error);
+                    if (error != 0)
+                    {
+                        PyErr_SetString(PyExc_RuntimeError, "Error: PXP site not found in H_PXP");
+                        goto error;
+                    }
+
+                    bonds[j] |= 1UL << i;
+                    bonds[col_index] |= 1UL << i; // hermiticity!
+                }
+            }
+        }
+
+        PyObject *csr = bonds_to_CSR(bonds, N, NH, sitelist, NULL, 0);
+        if (!csr) goto error;
+        free(bonds);
+        free(sitelist);
+
+        // include the shape, which scipy cannot infer if the last columns have no bonds
+        return Py_BuildValue("(N(kk))", csr, NH, NH);
+    }
+
     // Create a zeroed NH x NH Ndarray of ints
     npy_intp dimensions[2] = {NH, NH};
-    PyArrayObject *numpy_array = (PyArrayObject *) PyArray_ZEROS(2, dimensions, NPY_INT, 0);
+    numpy_array = (PyArrayObject *) PyArray_ZEROS(2, dimensions, NPY_INT, 0);
     if (!numpy_array)
     {
         PyErr_SetString(PyExc_RuntimeError, "Unable to create NumPy array in H_PXP");
-        return NULL;
+        goto error;
     }
 
     int error = 0;
@@ -133,6 +184,7 @@ PyObject *PXP_H(PyObject *self, PyObject *args)
 
     error:
         if (sitelist) free(sitelist);
+        if (bonds) free(bonds);
         if (numpy_array) Py_DECREF(numpy_array);
         return NULL;
 }